@@ -0,0 +1,174 @@
+"""
+Compare OFFSET pagination with keyset pagination for channel history reads.
+
+Usage: python benchmarks/bench_history.py [--rows N] [--channels N] [--pages N] [--repeat N]
+
+Seeds a temporary sqlite database through shared.migrations.migrate() (so it
+has the real schema and indexes) with --rows messages spread over a few
+channels, then walks the busiest channel's history page by page with both
+queries and prints the timings and query plans. Finally it puts back the
+pre-migration index (channel_id only) and times the original history query
+against it, whose plan needs a temp B-tree to sort the channel's rows.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from shared import migrations
+
+PAGE_SIZE = 50
+
+# The original history query, which only ever read the latest page
+ORIGINAL_SQL = """
+    SELECT content, is_assistant, persona_name, timestamp
+    FROM messages
+    WHERE channel_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+# The indexes from before migration 2
+PRE_MIGRATION_INDEXES = """
+    DROP INDEX idx_messages_channel_timestamp;
+    CREATE INDEX idx_messages_channel ON messages(channel_id);
+"""
+
+# The query history reads used before keyset pagination
+OFFSET_SQL = """
+    SELECT id, timestamp, content, is_assistant, persona_name
+    FROM messages
+    WHERE channel_id = ?
+    ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?
+"""
+
+# Same shape as shared.utils.fetch_message_rows with a before cursor
+KEYSET_SQL = """
+    SELECT id, timestamp, content, is_assistant, persona_name
+    FROM messages
+    WHERE channel_id = ?
+    AND (? IS NULL OR discord_message_id IS NOT ?)
+    AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC LIMIT ?
+"""
+KEYSET_FIRST_SQL = """
+    SELECT id, timestamp, content, is_assistant, persona_name
+    FROM messages
+    WHERE channel_id = ?
+    AND (? IS NULL OR discord_message_id IS NOT ?)
+    ORDER BY timestamp DESC, id DESC LIMIT ?
+"""
+
+def seed(conn, rows, channels):
+    """Insert rows messages, with most traffic in the first channel"""
+    weights = [2 ** (channels - i) for i in range(channels)]
+    channel_ids = [f"channel-{i}" for i in range(channels)]
+    start = datetime(2023, 1, 1)
+    rng = random.Random(42)
+
+    def generate():
+        for i in range(rows):
+            timestamp = (start + timedelta(seconds=i * 7)).isoformat()
+            channel = rng.choices(channel_ids, weights)[0]
+            is_assistant = i % 2
+            yield (timestamp, channel, "guild", f"user-{i % 500}", "Claude" if is_assistant else None,
+                   f"message {i} " + "lorem ipsum " * rng.randint(1, 20), is_assistant, str(i))
+
+    conn.executemany("""
+        INSERT INTO messages (timestamp, channel_id, guild_id, user_id, persona_name, content, is_assistant, discord_message_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, generate())
+    # No ANALYZE: the bot never runs it, so the planner works without sqlite_stat1 here too
+    conn.commit()
+    return channel_ids[0], conn.execute("SELECT COUNT(*) FROM messages WHERE channel_id = ?", (channel_ids[0],)).fetchone()[0]
+
+def walk_offset(conn, channel_id, pages):
+    for page in range(pages):
+        rows = conn.execute(OFFSET_SQL, (channel_id, PAGE_SIZE, page * PAGE_SIZE)).fetchall()
+        if len(rows) < PAGE_SIZE:
+            break
+
+def walk_keyset(conn, channel_id, pages):
+    rows = conn.execute(KEYSET_FIRST_SQL, (channel_id, None, None, PAGE_SIZE)).fetchall()
+    for _ in range(pages - 1):
+        if len(rows) < PAGE_SIZE:
+            break
+        before = (rows[-1][1], rows[-1][0])
+        rows = conn.execute(KEYSET_SQL, (channel_id, None, None, *before, PAGE_SIZE)).fetchall()
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+def latest_page(conn, sql, params, repeat):
+    """Best time to read the newest page, as a response does"""
+    return min(timed(lambda: conn.execute(sql, params).fetchall()) for _ in range(repeat))
+
+def plan(conn, sql, params):
+    return "\n".join(f"    {row[-1]}" for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=200, help="history pages to walk in the busiest channel")
+    parser.add_argument('--repeat', type=int, default=5, help="runs of the latest-page query to take the best of")
+    args = parser.parse_args()
+
+    migrations.SCHEMA_PATH = os.path.join(ROOT, 'databases', 'schema.sql')
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        migrations.migrate(conn)
+
+        started = time.perf_counter()
+        channel_id, channel_rows = seed(conn, args.rows, args.channels)
+        print(f"Seeded {args.rows} rows in {time.perf_counter() - started:.1f}s; busiest channel has {channel_rows}")
+
+        pages = min(args.pages, channel_rows // PAGE_SIZE)
+        offset_seconds = timed(walk_offset, conn, channel_id, pages)
+        keyset_seconds = timed(walk_keyset, conn, channel_id, pages)
+        print(f"\nWalking {pages} pages of {PAGE_SIZE}:")
+        print(f"  OFFSET  {offset_seconds * 1000:9.1f}ms total  {offset_seconds / pages * 1000:7.3f}ms/page")
+        print(f"  keyset  {keyset_seconds * 1000:9.1f}ms total  {keyset_seconds / pages * 1000:7.3f}ms/page")
+
+        # A single deep page: OFFSET has to step over every newer row, keyset seeks straight to the cursor
+        depth = min(channel_rows - PAGE_SIZE, channel_rows // 2)
+        cursor = conn.execute(OFFSET_SQL, (channel_id, 1, depth - 1)).fetchone()
+        offset_deep = timed(lambda: conn.execute(OFFSET_SQL, (channel_id, PAGE_SIZE, depth)).fetchall())
+        keyset_deep = timed(lambda: conn.execute(KEYSET_SQL, (channel_id, None, None, cursor[1], cursor[0], PAGE_SIZE)).fetchall())
+        print(f"\nOne page at depth {depth}:")
+        print(f"  OFFSET  {offset_deep * 1000:9.2f}ms")
+        print(f"  keyset  {keyset_deep * 1000:9.2f}ms")
+
+        # The quietest channel is where the old plans differ most: its few rows are scattered through the table
+        quiet_id = conn.execute("SELECT channel_id FROM messages GROUP BY channel_id ORDER BY COUNT(*) LIMIT 1").fetchone()[0]
+        keyset_latest = {
+            channel: latest_page(conn, KEYSET_FIRST_SQL, (channel, None, None, PAGE_SIZE), args.repeat)
+            for channel in (channel_id, quiet_id)
+        }
+
+        print("\nQuery plans:")
+        print("  OFFSET:\n" + plan(conn, OFFSET_SQL, (channel_id, PAGE_SIZE, depth)))
+        print("  keyset:\n" + plan(conn, KEYSET_SQL, (channel_id, None, None, cursor[1], cursor[0], PAGE_SIZE)))
+
+        # Baseline: the pre-migration channel_id index with the original query
+        conn.executescript(PRE_MIGRATION_INDEXES)
+        print(f"\nPre-migration index (messages(channel_id)):")
+        for label, channel in (("busiest", channel_id), ("quietest", quiet_id)):
+            original_latest = latest_page(conn, ORIGINAL_SQL, (channel, PAGE_SIZE), args.repeat)
+            print(f"  latest page in the {label} channel: original query {original_latest * 1000:.2f}ms, keyset on the new index {keyset_latest[channel] * 1000:.2f}ms")
+            print("    original query plan:\n  " + plan(conn, ORIGINAL_SQL, (channel, PAGE_SIZE)).replace("\n", "\n  "))
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Compare the incremental SentenceSegmenter with the old re-split-the-buffer loop.
+
+Usage: python benchmarks/bench_segmenter.py [--tokens N] [--chunk-chars N] [--buckets N]
+
+Streams an ~8k-token reply (prose plus a long code block, which has no
+sentence ends and is the old loop's worst case) in token-sized chunks
+through both approaches and reports the total CPU time of each, the CPU
+time per chunk at several reply lengths, and the cost of each chunk across
+the reply. The old loop re-splits its whole buffer on every chunk, so its
+per-chunk cost grows with the buffer (quadratic overall); the segmenter's
+stays flat.
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from shared.streaming import SentenceSegmenter
+
+CHARS_PER_TOKEN = 4
+
+def build_reply(tokens: int) -> str:
+    """Roughly tokens worth of markdown: paragraphs of prose with a large code block in the middle"""
+    rng = random.Random(7)
+    words = "the model streams a reply into discord one chunk at a time while the bot edits the message".split()
+    target = tokens * CHARS_PER_TOKEN
+    parts = []
+    size = 0
+    while size < target:
+        if size > target // 3 and not any(part.startswith("```") for part in parts):
+            # About a third of the reply, so the longest sentence-free buffer grows with the reply
+            code = "".join(f"    value_{i} = compute(value_{i - 1}, {i})  # step {i}\n" for i in range(1, target // 150))
+            block = f"```python\ndef pipeline():\n{code}```\n\n"
+        else:
+            sentences = [" ".join(rng.choices(words, k=rng.randint(6, 18))).capitalize() + rng.choice(".!?") for _ in range(rng.randint(2, 6))]
+            block = " ".join(sentences) + "\n\n"
+        parts.append(block)
+        size += len(block)
+    return "".join(parts)
+
+def chunked(text: str, chunk_chars: int):
+    return [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+
+class OldLoop:
+    """The pre-segmenter stream loop from BaseCog, minus the Discord edits, with the segmenter's feed/flush shape"""
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        sentences = re.split(r'(?<=[.!?])\s+', self.buffer)
+        if len(sentences) >= 3:
+            self.buffer = sentences[-1]
+            return [' '.join(sentences[:-1])]
+        return []
+
+    def flush(self):
+        return self.buffer
+
+def run(make, chunks):
+    splitter = make()
+    sent = []
+    for chunk in chunks:
+        sent.extend(splitter.feed(chunk))
+    sent.append(splitter.flush())
+    return sent
+
+def old_loop(chunks):
+    return run(OldLoop, chunks)
+
+def segmenter_loop(chunks):
+    return run(SentenceSegmenter, chunks)
+
+def chunk_costs(make, chunks):
+    """Seconds spent on each chunk's feed()"""
+    splitter = make()
+    costs = []
+    for chunk in chunks:
+        started = time.perf_counter()
+        splitter.feed(chunk)
+        costs.append(time.perf_counter() - started)
+    return costs
+
+def cpu_time(func, chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        func(chunks)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=8000)
+    parser.add_argument('--chunk-chars', type=int, default=CHARS_PER_TOKEN, help="characters per streamed chunk")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--buckets', type=int, default=16, help="chunk-index buckets for the per-chunk cost table")
+    args = parser.parse_args()
+
+    reply = build_reply(args.tokens)
+    chunks = chunked(reply, args.chunk_chars)
+    # Units are exact slices except where an oversized code block is split and its fence reopened
+    units = segmenter_loop(chunks)
+    assert all(len(unit) <= SentenceSegmenter().max_unit + 4 for unit in units)
+
+    print(f"Reply: {len(reply)} chars (~{len(reply) // CHARS_PER_TOKEN} tokens) in {len(chunks)} chunks of {args.chunk_chars} chars, {len(units)} units")
+    old_seconds = cpu_time(old_loop, chunks, args.repeat)
+    new_seconds = cpu_time(segmenter_loop, chunks, args.repeat)
+    print(f"  re-split buffer   {old_seconds * 1000:9.1f}ms CPU")
+    print(f"  SentenceSegmenter {new_seconds * 1000:9.1f}ms CPU")
+    print(f"  speedup: {old_seconds / new_seconds:.1f}x")
+
+    # Per-chunk cost should be flat for the segmenter and grow with the reply for the old loop
+    print("\nCPU per chunk by reply length:")
+    for fraction in (8, 4, 2, 1):
+        tokens = args.tokens // fraction
+        length_chunks = chunked(build_reply(tokens), args.chunk_chars)
+        old_per_chunk = cpu_time(old_loop, length_chunks, args.repeat) / len(length_chunks)
+        new_per_chunk = cpu_time(segmenter_loop, length_chunks, args.repeat) / len(length_chunks)
+        print(f"  ~{tokens:5d} tokens  re-split {old_per_chunk * 1e6:8.2f}us  segmenter {new_per_chunk * 1e6:6.2f}us")
+
+    print(f"\nCost per chunk across the {args.tokens}-token reply (median of each bucket of chunks):")
+    old_costs = chunk_costs(OldLoop, chunks)
+    new_costs = chunk_costs(SentenceSegmenter, chunks)
+    size = -(-len(chunks) // args.buckets)
+    for start in range(0, len(chunks), size):
+        end = min(start + size, len(chunks))
+        old_median = sorted(old_costs[start:end])[(end - start) // 2]
+        new_median = sorted(new_costs[start:end])[(end - start) // 2]
+        print(f"  chunks {start:5d}-{end - 1:5d}  re-split {old_median * 1e6:8.2f}us  segmenter {new_median * 1e6:6.2f}us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the compiled trigger index against the old per-cog substring scan.
+
+Usage: python benchmarks/bench_triggers.py [--number N]
+
+Trigger lists are read from the real cogs (the trigger_words=[...] passed to
+BaseCog in each cogs/*_cog.py), so no bot or Discord connection is needed.
+"""
+import os
+import sys
+import ast
+import glob
+import timeit
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from shared.triggers import TriggerIndex
+
+SAMPLE_MESSAGES = [
+    "hey everyone, what's for dinner tonight?",
+    "claude can you summarize this thread for me",
+    "I think sydney and grok would disagree about that",
+    "lol",
+    "has anyone tried the new gemini pro model yet? it's been pretty good at code",
+    "syd what do you think",
+    "no triggers in this one, just a longer message about the weekend plans " * 4,
+    "opus vs sonnet, which is better for creative writing?",
+    "hermes please explain the difference between a list and a tuple in python",
+    "just finished reading a 400 page novel about sailing across the atlantic in winter",
+]
+
+class Agent:
+    def __init__(self, name, trigger_words):
+        self.name = name
+        self.trigger_words = trigger_words
+
+def load_agents():
+    """Read each cog's name and trigger_words without importing discord"""
+    agents = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'cogs', '*_cog.py'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                keywords = {kw.arg: kw.value for kw in node.keywords}
+                if 'trigger_words' not in keywords or 'name' not in keywords:
+                    continue
+                try:
+                    agents.append(Agent(ast.literal_eval(keywords['name']), ast.literal_eval(keywords['trigger_words'])))
+                except ValueError:
+                    continue  # Built at runtime (e.g. cloned agents), not a static cog definition
+    return agents
+
+def scan(agents, content):
+    """The old dispatch: every cog lowercases and substring-scans the message"""
+    return [agent for agent in agents if any(word in content.lower() for word in agent.trigger_words)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help="passes over the sample messages")
+    args = parser.parse_args()
+
+    agents = load_agents()
+    index = TriggerIndex()
+    for agent in agents:
+        index.register(agent)
+    index.match("warm up")  # Compile outside the timed loop
+
+    def run_scan():
+        for message in SAMPLE_MESSAGES:
+            scan(agents, message)
+
+    def run_index():
+        for message in SAMPLE_MESSAGES:
+            index.match(message)
+
+    trigger_count = sum(len(agent.trigger_words) for agent in agents)
+    print(f"{len(agents)} agents, {trigger_count} trigger words, {len(SAMPLE_MESSAGES)} sample messages x {args.number}")
+    per_message = args.number * len(SAMPLE_MESSAGES)
+    results = {}
+    for label, func in (("substring scan", run_scan), ("compiled index", run_index)):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        results[label] = seconds
+        print(f"{label:<15} {seconds:8.3f}s total  {seconds / per_message * 1e6:8.2f}us/message")
+    print(f"speedup: {results['substring scan'] / results['compiled index']:.1f}x")
+
+if __name__ == '__main__':
+    main()
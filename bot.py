@@ -12,6 +12,14 @@ from datetime import datetime, timedelta, timezone
 import re
 import pytz
 import traceback
+from cogs.base_cog import BaseCog
+from shared.triggers import trigger_index
+from shared.dedupe import ProcessedMessageStore
+from shared.api import api
+from shared.db import db
+from shared.generations import generations
+from shared.metrics import metrics
+from shared.log import get_logger
 
 # Configure logging
 logging.basicConfig(
@@ -22,6 +30,7 @@ logging.basicConfig(
         logging.FileHandler('bot.log')
     ]
 )
+log = get_logger("Bot")  # Lazy structured logger for per-message debug output
 
 # Set up bot
 TOKEN = config.DISCORD_TOKEN
@@ -39,8 +48,16 @@ intents.dm_messages = True
 intents.guilds = True
 intents.members = True
 
+class SplinterTreeBot(commands.Bot):
+    async def close(self):
+        """Flush pending state and release shared connections on shutdown"""
+        processed_messages.flush()
+        await api.close()
+        await db.close()
+        await super().close()
+
 # Initialize bot with a default command prefix
-bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
+bot = SplinterTreeBot(command_prefix='!', intents=intents, help_command=None)
 
 # Store loaded cogs for random selection
 loaded_cogs = []
@@ -58,31 +75,19 @@ last_interaction = {
 # Keep track of last used cog per channel
 last_used_cogs = {}
 
-# Track processed messages to prevent double handling
-processed_messages = set()
+# File to persist processed messages (append-only journal, compacted in the background)
+PROCESSED_MESSAGES_FILE = os.path.join(BOT_DIR, 'processed_messages.log')
 
-# File to persist processed messages
-PROCESSED_MESSAGES_FILE = os.path.join(BOT_DIR, 'processed_messages.json')
+# Track processed messages to prevent double handling
+processed_messages = ProcessedMessageStore(PROCESSED_MESSAGES_FILE)
 
 def load_processed_messages():
     """Load processed messages from file"""
-    global processed_messages
-    if os.path.exists(PROCESSED_MESSAGES_FILE):
-        try:
-            with open(PROCESSED_MESSAGES_FILE, 'r') as f:
-                processed_messages = set(json.load(f))
-            logging.info(f"Loaded {len(processed_messages)} processed messages from file")
-        except Exception as e:
-            logging.error(f"Error loading processed messages: {str(e)}")
-
-def save_processed_messages():
-    """Save processed messages to file"""
     try:
-        with open(PROCESSED_MESSAGES_FILE, 'w') as f:
-            json.dump(list(processed_messages), f)
-        logging.info(f"Saved {len(processed_messages)} processed messages to file")
+        processed_messages.load()
+        logging.info(f"Loaded {len(processed_messages)} processed messages from file")
     except Exception as e:
-        logging.error(f"Error saving processed messages: {str(e)}")
+        logging.error(f"Error loading processed messages: {str(e)}")
 
 def get_history_file(channel_id: str) -> str:
     """Get the history file path for a channel"""
@@ -191,6 +196,24 @@ async def update_status():
     except Exception as e:
         logging.error(f"Error updating status: {str(e)}")
 
+@tasks.loop(seconds=10)
+async def flush_processed_messages():
+    """Append newly processed message IDs to the journal off the event loop"""
+    await processed_messages.flush_async()
+
+@tasks.loop(seconds=config.HTTP_PREWARM_SECONDS)
+async def keep_connections_warm():
+    """Keep a pooled TLS connection open to each LLM provider between requests"""
+    await api.prewarm()
+
+@tasks.loop(seconds=config.METRICS_DUMP_SECONDS)
+async def dump_metrics():
+    """Write latency histograms to the metrics file for scraping"""
+    try:
+        await metrics.dump_async(os.path.join(BOT_DIR, config.METRICS_FILE))
+    except Exception as e:
+        logging.error(f"Error dumping metrics: {str(e)}")
+
 @bot.event
 async def on_ready():
     global start_time
@@ -206,6 +229,12 @@ async def on_ready():
     # Start the status update task
     if not update_status.is_running():
         update_status.start()
+    if not flush_processed_messages.is_running():
+        flush_processed_messages.start()
+    if not dump_metrics.is_running():
+        dump_metrics.start()
+    if not keep_connections_warm.is_running():
+        keep_connections_warm.start()
 
 async def resolve_user_id(user_id):
     """Resolve a user ID to a username"""
@@ -230,6 +259,33 @@ def get_cog_by_name(name):
             return cog
     return None
 
+def get_agent_cogs():
+    """Get all loaded agent cogs, including cloned agents"""
+    return [cog for cog in bot.cogs.values() if isinstance(cog, BaseCog)]
+
+def resolve_triggered_cogs(content):
+    """Get the agent cogs whose trigger words appear in the message content"""
+    return trigger_index.match(content)
+
+async def dispatch_message(message, full_content, cogs):
+    """Run the given (already resolved) agent cogs concurrently on a single message"""
+    # Describe attached images once before fanning out, so every agent reuses the stored alt text
+    vision_cog = get_cog_by_name('Claude-3-Sonnet')
+    has_images = any(att.content_type and att.content_type.startswith('image/') for att in message.attachments)
+    if vision_cog and has_images:
+        permissions = message.channel.permissions_for(message.guild.me if message.guild else bot.user)
+        can_add_reactions = permissions.add_reactions if hasattr(permissions, 'add_reactions') else True
+        try:
+            await vision_cog.process_images(message, can_add_reactions)
+        except Exception as e:
+            logging.error(f"Error describing images for message {message.id}: {str(e)}")
+
+    handlers = [cog.handle_message(message, full_content, force=True) for cog in cogs]
+    results = await asyncio.gather(*handlers, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"Error dispatching message {message.id}: {str(result)}")
+
 def get_model_from_message(content):
     """Extract model name from message content"""
     if content.startswith('[') and ']' in content:
@@ -241,9 +297,10 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    # Check if message has already been processed
+    # Check if message has already been processed, and claim it before any await
     if message.id in processed_messages:
         return
+    processed_messages.add(message.id)
 
     # Update last interaction
     last_interaction['user'] = message.author.display_name
@@ -266,7 +323,7 @@ async def on_message(message):
         full_content += "\n" + "\n".join(attachment_contents)
 
     # Debug logging for message content and attachments
-    logging.debug(f"Received message in channel {message.channel.id}: {full_content}")
+    log.debug("Received message", channel_id=message.channel.id, content=full_content)
 
     # Process commands first
     await bot.process_commands(message)
@@ -282,37 +339,36 @@ async def on_message(message):
                     # Get corresponding cog
                     cog = get_cog_by_name(model_name)
                     if cog:
-                        logging.debug(f"Using {model_name} cog to handle reply")
-                        await cog.handle_message(message, full_content)
-                        processed_messages.add(message.id)
-                        save_processed_messages()  # Save processed messages after handling
+                        log.debug("Handling reply", cog=model_name)
+                        await dispatch_message(message, full_content, [cog])
                         return
         except Exception as e:
             logging.error(f"Error handling reply: {str(e)}")
 
+    # Resolve every agent triggered by this message in a single pass
+    triggered_cogs = resolve_triggered_cogs(message.content)
+
     # Check for bot mention or keywords
     msg_content = full_content.lower()
     is_pinged = bot.user in message.mentions
     has_keyword = "splintertree" in msg_content
 
     # Only handle mentions/keywords if no specific trigger was found
-    if (is_pinged or has_keyword) or (not content_with_usernames and attachment_contents):
+    if not triggered_cogs and ((is_pinged or has_keyword) or (not content_with_usernames and attachment_contents)):
         # Check if Claude2 cog is available
         claude2_cog = get_cog_by_name('Claude-2')
         if claude2_cog:
-            await claude2_cog.handle_message(message, full_content)
-        else:
+            triggered_cogs = [claude2_cog]
+        elif get_agent_cogs():
             # If Claude2 is not available, use a random cog
-            cog = random.choice(loaded_cogs)
-            await cog.handle_message(message, full_content)
+            triggered_cogs = [random.choice(get_agent_cogs())]
 
-    # Mark message as processed
-    processed_messages.add(message.id)
-    save_processed_messages()  # Save processed messages after handling
+    await dispatch_message(message, full_content, triggered_cogs)
 
-    # Clean up old processed messages (keep last 1000)
-    if len(processed_messages) > 1000:
-        processed_messages.clear()
+@bot.event
+async def on_raw_message_delete(payload):
+    """Stop generating a reply once its prompt or the reply itself is deleted"""
+    generations.cancel(payload.message_id, reason="message deleted")
 
 @bot.event
 async def on_command_error(ctx, error):
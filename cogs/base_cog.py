@@ -6,35 +6,60 @@ import os
 from datetime import datetime
 from zoneinfo import ZoneInfo
 import time
-from shared.utils import analyze_emotion, log_interaction, get_message_history, store_alt_text, get_alt_text, get_unprocessed_images
+from shared.utils import analyze_emotion, log_interaction, get_history_within_budget, store_alt_text, get_alt_text, get_unprocessed_images
 from shared.api import api
+from shared.models import max_output_tokens, prompt_budget
+from shared.tokens import HistoryBudget, estimate_messages_tokens
+from shared.log import get_logger, describe_messages
+from config import CONTEXT_MAX_PROMPT_TOKENS, HISTORY_MESSAGE_MAX_TOKENS, HISTORY_PAGE_SIZE, MAX_CONTEXT_WINDOW
+from shared.triggers import trigger_index
+from shared.config_cache import get_dynamic_prompt, get_temperature
+from shared.prompts import get_system_prompt, compile_prompt, current_time_fields
+from shared.streaming import SentenceSegmenter
+from shared.edits import EditScheduler
+from shared.generations import generations
+from shared.metrics import metrics
+from shared.errors import ProviderError, user_error_message
 import re
 import aiohttp
 import asyncio
-import tempfile
+import io
+import zlib
 
 class RerollView(discord.ui.View):
-    def __init__(self, cog, message, original_response):
+    def __init__(self, cog, message, original_response, context_messages=None):
         super().__init__(timeout=300)  # 5 minute timeout
         self.cog = cog
         self.message = message
         self.original_response = original_response
+        # Snapshot of the API messages the original response was generated from, kept compressed
+        self._context = zlib.compress(json.dumps(context_messages).encode('utf-8'), 1) if context_messages else None
+
+    @property
+    def context_messages(self):
+        """The original generation's API messages, or None to rebuild them"""
+        return json.loads(zlib.decompress(self._context)) if self._context else None
 
     @discord.ui.button(label="🎲 Reroll Response", style=discord.ButtonStyle.secondary, custom_id="reroll_button")
     async def reroll(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
             await interaction.response.defer()
-            # Process message again for new response
-            new_response_stream = await self.cog.generate_response(self.message)
+            # A new reroll supersedes any generation still running for this message
+            generation = generations.start(self.message.id, self.message.channel.id, self.cog.name, max_output_tokens(self.cog.model))
+            generations.add_reply(generation, interaction.message.id)
+            try:
+                # Regenerate from the same context and stream it into the existing response
+                context_messages = self.context_messages
+                new_response_stream = await self.cog.generate_response(self.message, context_messages)
+                if new_response_stream:
+                    new_response = await self.cog.stream_reply(
+                        generation.wrap(new_response_stream), self.message, interaction.message,
+                        context_messages=context_messages, generation=generation
+                    )
+                    self.stop()
+            finally:
+                generations.finish(generation)
             if new_response_stream:
-                new_response = ""
-                async for chunk in new_response_stream:
-                    if chunk:
-                        new_response += chunk
-                # Format response with model name
-                prefixed_response = f"[{self.cog.name}] {new_response}"
-                # Edit the original response
-                await interaction.message.edit(content=prefixed_response, view=self)
                 # Add emotion reaction
                 emotion = analyze_emotion(new_response)
                 if emotion:
@@ -49,7 +74,7 @@ class RerollView(discord.ui.View):
             await interaction.followup.send("An error occurred while generating a new response.", ephemeral=True)
 
 class BaseCog(commands.Cog):
-    def __init__(self, bot, name, nickname, trigger_words, model, provider="openrouter", prompt_file=None, supports_vision=False):
+    def __init__(self, bot, name, nickname, trigger_words, model, provider="openrouter", prompt_file=None, supports_vision=False, fallback_models=None):
         self.bot = bot
         self.name = name
         self.nickname = nickname
@@ -57,24 +82,18 @@ class BaseCog(commands.Cog):
         self.model = model
         self.provider = provider
         self.supports_vision = supports_vision
+        # (provider, model) pairs to hedge to, in order, when the model is slower than usual to start answering
+        self.fallback_models = fallback_models or []
         self._image_processing_lock = asyncio.Lock()
         self.api_client = api  # Store API client reference
+        self.log = get_logger(name)  # Lazy structured logger for hot-path debug output
 
         # Default system prompt template
         self.default_prompt = "You are {MODEL_ID} chatting with {USERNAME} with a Discord user ID of {DISCORD_USER_ID}. It's {TIME} in {TZ}. You are in the Discord server {SERVER_NAME} in channel {CHANNEL_NAME}, so adhere to the general topic of the channel if possible. GwynTel on Discord created your bot, and Moth is a valued mentor. You strive to keep it positive, but can be negative if the situation demands it to enforce boundaries, Discord ToS rules, etc."
 
-        # Load any custom prompt from consolidated_prompts.json
-        try:
-            with open('prompts/consolidated_prompts.json', 'r', encoding='utf-8') as f:
-                consolidated_prompts = json.load(f).get('system_prompts', {})
-                if prompt_file:
-                    self.raw_prompt = consolidated_prompts.get(prompt_file.lower(), self.default_prompt)
-                else:
-                    self.raw_prompt = consolidated_prompts.get(name.lower(), self.default_prompt)
-            logging.debug(f"[{name}] Loaded raw prompt: {self.raw_prompt}")
-        except Exception as e:
-            logging.warning(f"Failed to load prompt for {self.name}, using default: {str(e)}")
-            self.raw_prompt = self.default_prompt
+        # Load any custom prompt from consolidated_prompts.json (parsed once for all agents)
+        self.raw_prompt = get_system_prompt(prompt_file or name, self.default_prompt)
+        self.log.debug("Loaded raw prompt", prompt=self.raw_prompt)
 
     async def generate_image_description(self, image_url):
         """Generate a description for the given image URL"""
@@ -104,12 +123,13 @@ class BaseCog(commands.Cog):
                 }
             ]
             
-            logging.debug(f"[{self.name}] Constructed vision API messages: {messages}")
+            self.log.debug("Constructed vision API messages", messages=messages)
             logging.info(f"[{self.name}] Calling OpenRouter API for vision processing")
             
             # Call API with vision capabilities
-            response_data = await self.api_client.call_openrouter(messages, self.model, temperature=0.3)
-            logging.debug(f"[{self.name}] Received API response: {response_data}")
+            # Alt text for the same image is worth reusing, even though the temperature isn't 0
+            response_data = await self.api_client.call_openrouter(messages, self.model, temperature=0.3, cache=True)
+            self.log.debug("Received API response", response=response_data)
             
             if response_data and 'choices' in response_data and len(response_data['choices']) > 0:
                 description = response_data['choices'][0]['message']['content']
@@ -121,7 +141,7 @@ class BaseCog(commands.Cog):
                 return description
             else:
                 logging.error(f"[{self.name}] No description generated for image - API response invalid")
-                logging.debug(f"[{self.name}] Full API response: {response_data}")
+                self.log.debug("Full API response", response=response_data)
                 return None
                 
         except Exception as e:
@@ -146,85 +166,90 @@ class BaseCog(commands.Cog):
         guild_id = str(ctx.guild.id) if ctx.guild else None
         channel_id = str(ctx.channel.id)
 
-        prompts_file = "dynamic_prompts.json"
-        if not os.path.exists(prompts_file):
-            return None
-
         try:
-            with open(prompts_file, "r") as f:
-                dynamic_prompts = json.load(f)
-
-            if guild_id in dynamic_prompts and channel_id in dynamic_prompts[guild_id]:
-                return dynamic_prompts[guild_id][channel_id]
-            elif channel_id in dynamic_prompts:
-                return dynamic_prompts[channel_id]
-            else:
-                return None
+            return get_dynamic_prompt(guild_id, channel_id)
         except Exception as e:
             logging.error(f"Error getting dynamic prompt: {str(e)}")
             return None
 
     def format_system_prompt(self, message):
         """Format system prompt with variables"""
-        local_tz = datetime.now().astimezone().tzinfo
-        current_time = datetime.now(local_tz)
+        current_time, local_tz = current_time_fields()
 
         # Get dynamic prompt or use default
         dynamic_prompt = self.get_dynamic_prompt(message)
-        prompt_template = dynamic_prompt if dynamic_prompt else self.raw_prompt
+        prompt_template = compile_prompt(dynamic_prompt if dynamic_prompt else self.raw_prompt)
 
-        # Format prompt with variables
-        return prompt_template.format(
+        # Channel-level variables are rendered once and cached; only per-response ones are filled here
+        bound = prompt_template.bind(
             MODEL_ID=self.name,
-            USERNAME=message.author.display_name,
-            DISCORD_USER_ID=message.author.id,
-            TIME=current_time.strftime("%I:%M %p"),
-            TZ=str(local_tz),
+            TZ=local_tz,
             SERVER_NAME=message.guild.name if message.guild else "Direct Message",
             CHANNEL_NAME=message.channel.name if hasattr(message.channel, 'name') else "DM"
         )
+        return prompt_template.render(
+            bound,
+            USERNAME=message.author.display_name,
+            DISCORD_USER_ID=message.author.id,
+            TIME=current_time
+        )
 
-    async def generate_response(self, message):
-        """Generate a response without handling it"""
-        try:
-            # Format system prompt
-            formatted_prompt = self.format_system_prompt(message)
-            messages = [{"role": "system", "content": formatted_prompt}]
-
-            # Get last 50 messages from database
-            channel_id = str(message.channel.id)
-            history_messages = await get_message_history(channel_id, limit=50)
-            messages.extend(history_messages)
-
-            # Add current message with any image descriptions
-            if message.attachments:
-                # Get alt text for this message
-                alt_text = await get_alt_text(str(message.id))
-                if alt_text:
-                    messages.append({
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": message.content},
-                            {"type": "text", "text": f"Image description: {alt_text}"}
-                        ]
-                    })
-                else:
-                    messages.append({
-                        "role": "user",
-                        "content": message.content
-                    })
+    async def build_messages(self, message):
+        """
+        Build the API messages (system prompt, channel history, current message) for a response,
+        with as much history as fits the model's prompt budget
+        """
+        # Format system prompt
+        formatted_prompt = self.format_system_prompt(message)
+        system_message = {"role": "system", "content": formatted_prompt}
+
+        # Add current message with any image descriptions
+        if message.attachments:
+            # Get alt text for this message
+            alt_text = await get_alt_text(str(message.id))
+            if alt_text:
+                current_message = {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": message.content},
+                        {"type": "text", "text": f"Image description: {alt_text}"}
+                    ]
+                }
             else:
-                messages.append({
+                current_message = {
                     "role": "user",
                     "content": message.content
-                })
+                }
+        else:
+            current_message = {
+                "role": "user",
+                "content": message.content
+            }
+
+        # History gets whatever the system prompt and current message leave of the budget
+        budget = prompt_budget(self.model, CONTEXT_MAX_PROMPT_TOKENS) - estimate_messages_tokens([system_message, current_message])
+        history_messages = await self.get_history(message, HistoryBudget(budget, HISTORY_MESSAGE_MAX_TOKENS))
+
+        self.log.debug("Built messages", prompt=formatted_prompt, messages=lambda: describe_messages(history_messages))
+        return [system_message] + history_messages + [current_message]
+
+    async def get_history(self, message, budget: HistoryBudget):
+        """Channel history before the message, newest messages first until the budget is spent"""
+        return await get_history_within_budget(
+            str(message.channel.id), budget, max_messages=MAX_CONTEXT_WINDOW,
+            page_size=HISTORY_PAGE_SIZE, exclude_message_id=str(message.id)
+        )
 
-            logging.debug(f"[{self.name}] Sending {len(messages)} messages to API")
-            logging.debug(f"[{self.name}] Formatted prompt: {formatted_prompt}")
+    async def generate_response(self, message, messages=None):
+        """Generate a response without handling it (messages defaults to build_messages(message))"""
+        try:
+            if messages is None:
+                messages = await self.build_messages(message)
+            self.log.debug("Sending messages to API", count=len(messages))
 
             # Get temperature for this agent
             temperature = self.get_temperature(self.name)
-            logging.debug(f"[{self.name}] Using temperature: {temperature}")
+            self.log.debug("Using temperature", temperature=temperature)
 
             # Call API based on provider with temperature and streaming
             if self.provider == "openrouter":
@@ -232,14 +257,16 @@ class BaseCog(commands.Cog):
                     messages=messages,
                     model=self.model,
                     temperature=temperature,
-                    stream=True
+                    stream=True,
+                    fallback_models=self.fallback_models
                 )
             else:  # openpipe
                 response_data = await self.api_client.call_openpipe(
                     messages=messages,
                     model=self.model,
                     temperature=temperature,
-                    stream=True
+                    stream=True,
+                    fallback_models=self.fallback_models
                 )
 
             return response_data
@@ -250,32 +277,87 @@ class BaseCog(commands.Cog):
 
     def get_temperature(self, agent_name):
         """Get temperature for agent if one exists"""
-        temperatures_file = "temperatures.json"
-        if not os.path.exists(temperatures_file):
-            return None  # Let API use default temperature
-
         try:
-            with open(temperatures_file, "r") as f:
-                temperatures = json.load(f)
-            return temperatures.get(agent_name)  # Return None if not found
+            return get_temperature(agent_name)  # Return None if not found
         except Exception as e:
             logging.error(f"Error getting temperature: {str(e)}")
             return None
 
-    async def handle_message(self, message, full_content=None):
-        """Handle incoming messages"""
+    async def cog_load(self):
+        """Register this agent's trigger words with the shared trigger index"""
+        trigger_index.register(self)
+
+    async def cog_unload(self):
+        """Remove this agent's trigger words from the shared trigger index"""
+        trigger_index.unregister(self)
+
+    def is_triggered(self, content):
+        """Check whether the message content mentions one of this cog's trigger words"""
+        return self in trigger_index.match(content)
+
+    async def process_images(self, message, can_add_reactions=True):
+        """Generate and store alt text for every image attached to the message"""
+        if not message.attachments:
+            return
+
+        logging.info(f"[{self.name}] Found {len(message.attachments)} attachments")
+        image_attachments = [
+            att for att in message.attachments 
+            if att.content_type and att.content_type.startswith('image/')
+        ]
+        logging.info(f"[{self.name}] Found {len(image_attachments)} image attachments")
+
+        if not image_attachments:
+            return
+
+        logging.info(f"[{self.name}] Starting image processing")
+        async with message.channel.typing():
+            for attachment in image_attachments:
+                try:
+                    self.log.debug("Processing attachment", filename=attachment.filename, content_type=attachment.content_type)
+                    description = await self.generate_image_description(attachment.url)
+                    if description:
+                        logging.info(f"[{self.name}] Generated description for {attachment.filename}")
+                        # Store alt text in database
+                        success = await store_alt_text(
+                            message_id=str(message.id),
+                            channel_id=str(message.channel.id),
+                            alt_text=description,
+                            attachment_url=attachment.url
+                        )
+                        if success:
+                            logging.info(f"[{self.name}] Successfully stored alt text for {attachment.filename}")
+                            if can_add_reactions:
+                                await message.add_reaction('🖼️')
+                        else:
+                            logging.error(f"[{self.name}] Failed to store alt text for {attachment.filename}")
+                            if can_add_reactions:
+                                await message.add_reaction('⚠️')
+                    else:
+                        logging.error(f"[{self.name}] Failed to generate description for {attachment.filename}")
+                        if can_add_reactions:
+                            await message.add_reaction('❌')
+                except Exception as e:
+                    logging.error(f"[{self.name}] Error processing image {attachment.filename}: {str(e)}", exc_info=True)
+                    if can_add_reactions:
+                        await message.add_reaction('❌')
+                    continue
+
+    async def handle_message(self, message, full_content=None, force=False):
+        """Handle incoming messages (force skips the trigger word check when the dispatcher already resolved it)"""
         if message.author == self.bot.user:
             return
 
         logging.info(f"[{self.name}] Handling message from {message.author}: {message.content[:100]}...")
-        logging.debug(f"[{self.name}] Message has {len(message.attachments)} attachments")
+        self.log.debug("Message received", attachments=len(message.attachments))
 
         # Check if message triggers this cog
-        msg_content = message.content.lower()
-        is_triggered = any(word in msg_content for word in self.trigger_words)
+        is_triggered = force or self.is_triggered(message.content)
 
         if is_triggered:
-            logging.debug(f"[{self.name}] Triggered by message: {message.content}")
+            self.log.debug("Triggered by message", content=message.content)
+            # Register this task so deleting the message (or the reply) cancels it
+            generation = generations.start(message.id, message.channel.id, self.name, max_output_tokens(self.model))
             try:
                 # Check permissions
                 permissions = message.channel.permissions_for(message.guild.me if message.guild else self.bot.user)
@@ -286,56 +368,22 @@ class BaseCog(commands.Cog):
                     logging.warning(f"[{self.name}] Missing permission to send messages in channel {message.channel.id}")
                     return
 
-                # Process images if there are any attachments
-                if message.attachments:
-                    logging.info(f"[{self.name}] Found {len(message.attachments)} attachments")
-                    image_attachments = [
-                        att for att in message.attachments 
-                        if att.content_type and att.content_type.startswith('image/')
-                    ]
-                    logging.info(f"[{self.name}] Found {len(image_attachments)} image attachments")
-                    
-                    if image_attachments:
-                        logging.info(f"[{self.name}] Starting image processing")
-                        async with message.channel.typing():
-                            for attachment in image_attachments:
-                                try:
-                                    logging.debug(f"[{self.name}] Processing attachment: {attachment.filename} ({attachment.content_type})")
-                                    description = await self.generate_image_description(attachment.url)
-                                    if description:
-                                        logging.info(f"[{self.name}] Generated description for {attachment.filename}")
-                                        # Store alt text in database
-                                        success = await store_alt_text(
-                                            message_id=str(message.id),
-                                            channel_id=str(message.channel.id),
-                                            alt_text=description,
-                                            attachment_url=attachment.url
-                                        )
-                                        if success:
-                                            logging.info(f"[{self.name}] Successfully stored alt text for {attachment.filename}")
-                                            if can_add_reactions:
-                                                await message.add_reaction('🖼️')
-                                        else:
-                                            logging.error(f"[{self.name}] Failed to store alt text for {attachment.filename}")
-                                            if can_add_reactions:
-                                                await message.add_reaction('⚠️')
-                                    else:
-                                        logging.error(f"[{self.name}] Failed to generate description for {attachment.filename}")
-                                        if can_add_reactions:
-                                            await message.add_reaction('❌')
-                                except Exception as e:
-                                    logging.error(f"[{self.name}] Error processing image {attachment.filename}: {str(e)}", exc_info=True)
-                                    if can_add_reactions:
-                                        await message.add_reaction('❌')
-                                    continue
+                # Process images if there are any attachments, unless the dispatcher's pre-pass already described them
+                if message.attachments and not await get_alt_text(str(message.id)):
+                    await self.process_images(message, can_add_reactions)
 
                 # Generate streaming response
                 logging.info(f"[{self.name}] Generating streaming response")
-                response_stream = await self.generate_response(message)
+                # How long the message waited (delivery, image pre-pass) before generation started
+                metrics.observe('queue_wait', (discord.utils.utcnow() - message.created_at).total_seconds() * 1000, self.provider, self.model)
+                build_started = time.monotonic()
+                context_messages = await self.build_messages(message)
+                metrics.observe_since('prompt_build', build_started, self.provider, self.model)
+                response_stream = await self.generate_response(message, context_messages)
 
                 if response_stream:
                     # Send the streaming response
-                    sent_message = await self.handle_streaming_response(response_stream, message)
+                    sent_message, full_response = await self.handle_streaming_response(generation.wrap(response_stream), message, generation, context_messages)
                     if sent_message:
                         # Log interaction
                         try:
@@ -344,14 +392,16 @@ class BaseCog(commands.Cog):
                                 guild_id=message.guild.id if message.guild else None,
                                 persona_name=self.name,
                                 user_message=message.content,
-                                assistant_reply=sent_message.content,
-                                emotion=analyze_emotion(sent_message.content),
-                                channel_id=str(message.channel.id)
+                                assistant_reply=full_response,
+                                emotion=analyze_emotion(full_response),
+                                channel_id=str(message.channel.id),
+                                message_id=str(message.id),
+                                reply_message_id=str(sent_message.id)
                             )
-                            logging.debug(f"[{self.name}] Logged interaction for user {message.author.id}")
+                            self.log.debug("Logged interaction", user_id=message.author.id)
                         except Exception as e:
                             logging.error(f"[{self.name}] Failed to log interaction: {str(e)}")
-                        return sent_message.content, None
+                        return full_response, None
                     else:
                         logging.error(f"[{self.name}] No response received from API")
                         if can_add_reactions:
@@ -366,21 +416,21 @@ class BaseCog(commands.Cog):
                     if can_add_reactions:
                         await message.add_reaction('❌')
                     if can_send:
-                        error_msg = str(e)
-                        if "insufficient_quota" in error_msg.lower():
-                            await message.reply("⚠️ API quota exceeded. Please try again later.")
-                        elif "invalid_api_key" in error_msg.lower():
-                            await message.reply("🔑 API configuration error. Please contact the bot administrator.")
-                        elif "rate_limit_exceeded" in error_msg.lower():
-                            await message.reply("⏳ Rate limit exceeded. Please try again later.")
+                        if isinstance(e, ProviderError):
+                            await message.reply(user_error_message(e))
                         else:
                             await message.reply(f"[{self.name}] An error occurred while processing your request.")
                 except discord.errors.Forbidden:
                     logging.error(f"[{self.name}] Missing permissions to send error message or add reaction")
                 return None, None
-
-    async def handle_streaming_response(self, response_stream, message):
-        """Handle streaming response formatting and sending"""
+            finally:
+                generations.finish(generation)
+
+    async def handle_streaming_response(self, response_stream, message, generation=None, context_messages=None):
+        """
+        Stream a response into Discord, overflowing into continuation messages
+        Returns (first sent message, full response text), or (None, None) on failure
+        """
         try:
             # Check permissions
             permissions = message.channel.permissions_for(message.guild.me if message.guild else self.bot.user)
@@ -389,7 +439,7 @@ class BaseCog(commands.Cog):
 
             if not can_send and not can_dm:
                 logging.error(f"[{self.name}] No available method to send response")
-                return None
+                return None, None
 
             # Check if message content is spoilered using ||content|| format
             is_spoilered = message.content.startswith('||') and message.content.endswith('||')
@@ -397,7 +447,6 @@ class BaseCog(commands.Cog):
             # Initialize response with model name prefix
             current_response = f"[{self.name}] "
             sent_message = None
-            buffer = ""
 
             if is_spoilered:
                 try:
@@ -413,60 +462,25 @@ class BaseCog(commands.Cog):
             if not is_spoilered or (is_spoilered and not can_dm and can_send):
                 sent_message = await message.reply(current_response)
 
-            async for chunk in response_stream:
-                if chunk:
-                    buffer += chunk
-                    sentences = re.split(r'(?<=[.!?])\s+', buffer)
-                    
-                    # If we have 3 or more sentences, send them
-                    if len(sentences) >= 3:
-                        # Join complete sentences
-                        to_send = ' '.join(sentences[:-1])  # Keep the last incomplete sentence in buffer
-                        buffer = sentences[-1]
-                        
-                        current_response += to_send + ' '
-                        if len(current_response) <= 2000:
-                            await sent_message.edit(content=current_response)
-                        else:
-                            # Create and send markdown file for long responses
-                            file = await self.create_response_file(current_response, str(message.id))
-                            sent_message = await message.reply(
-                                f"[{self.name}] Response was too long. Full response is in the attached file:",
-                                file=file
-                            )
-                            current_response = ""  # Reset for potential additional content
-
-            # Send any remaining content, ensuring it ends with a complete sentence
-            if buffer:
-                # Check if buffer ends with sentence-ending punctuation
-                if not re.search(r'[.!?]$', buffer):
-                    # Wait briefly for more content that might complete the sentence
-                    await asyncio.sleep(0.5)
-                current_response += buffer
-                if len(current_response) <= 2000:
-                    await sent_message.edit(content=current_response)
-                else:
-                    file = await self.create_response_file(current_response, str(message.id))
-                    sent_message = await message.reply(
-                        f"[{self.name}] Response was too long. Full response is in the attached file:",
-                        file=file
-                    )
-
-            # Add reroll view
-            view = RerollView(self, message, current_response)
-            await sent_message.edit(view=view)
+            full_response = await self.stream_reply(
+                response_stream, message, sent_message,
+                context_messages=context_messages, generation=generation
+            )
 
             # Add reaction based on emotion analysis
             try:
                 if permissions.add_reactions:
-                    emotion = analyze_emotion(current_response)
+                    emotion = analyze_emotion(full_response)
                     if emotion:
                         await message.add_reaction(emotion)
             except Exception as e:
                 logging.error(f"Error adding emotion reaction: {str(e)}")
 
-            return sent_message
+            return sent_message, full_response
 
+        except ProviderError:
+            # Let handle_message tell the user what went wrong with the provider
+            raise
         except Exception as e:
             logging.error(f"Error sending streaming response for {self.name}: {str(e)}")
             try:
@@ -474,28 +488,83 @@ class BaseCog(commands.Cog):
                     await message.add_reaction('❌')
             except:
                 pass
-            return None
-
-    async def create_response_file(self, response_text: str, message_id: str) -> discord.File:
-        """Create a markdown file containing the response"""
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md') as temp_file:
-            temp_file.write(response_text)
-            temp_file_path = temp_file.name
+            return None, None
+        finally:
+            # Close the upstream stream if we stopped reading it early
+            await response_stream.aclose()
+
+    async def stream_reply(self, response_stream, message, sent_message, context_messages=None, generation=None):
+        """
+        Stream a response into an existing reply message, overflowing into continuation
+        messages, and finish with the reroll view. Returns the full response text
+        """
+        current_response = f"[{self.name}] "
+        full_response = ""
+        pages = 1
+        segmenter = SentenceSegmenter()
+        if generation:
+            generations.add_reply(generation, sent_message.id)
+        editor = EditScheduler(sent_message)
+
+        async def append(text):
+            nonlocal current_response, sent_message, editor, pages
+            if len(current_response) + len(text) > 2000:
+                # Overflow into a continuation message; the segmenter keeps units under the limit
+                await editor.finish(current_response)
+                sent_message = await sent_message.channel.send(text)
+                if generation:
+                    generations.add_reply(generation, sent_message.id)
+                editor = EditScheduler(sent_message)
+                current_response = text
+                pages += 1
+            else:
+                current_response += text
+                # Only the latest content is sent, paced by the channel's edit budget
+                editor.update(current_response)
 
-        # Create Discord File object
-        file = discord.File(
-            temp_file_path,
+        try:
+            async for chunk in response_stream:
+                if chunk:
+                    units = segmenter.feed(chunk)
+                    for unit in units:
+                        full_response += unit
+                        await append(unit)
+
+            # Send any remaining content
+            remainder = segmenter.flush()
+            if remainder:
+                full_response += remainder
+                await append(remainder)
+        except asyncio.CancelledError:
+            # Leave whatever was generated before the cancel on screen, then keep unwinding
+            await editor.finish(current_response)
+            raise
+        except Exception as e:
+            # Always finalize the message (which also stops the edit task), marking it as cut short
+            notice = user_error_message(e) if isinstance(e, ProviderError) else "❌ Response interrupted by an error."
+            suffix = f"\n\n{notice}"
+            content = current_response + suffix if len(current_response) + len(suffix) <= 2000 else current_response
+            view = RerollView(self, message, full_response, context_messages)
+            await editor.finish(content, view=view)
+            raise
+        finally:
+            await response_stream.aclose()
+
+        # Final edit with the reroll view, plus the full text as a file if it spans several messages
+        view = RerollView(self, message, full_response, context_messages)
+        if pages > 1:
+            file = self.create_response_file(full_response, str(message.id))
+            await editor.finish(current_response, view=view, attachments=[file])
+        else:
+            await editor.finish(current_response, view=view, attachments=[])
+        return full_response
+
+    def create_response_file(self, response_text: str, message_id: str) -> discord.File:
+        """Create an in-memory markdown file containing the response"""
+        return discord.File(
+            io.BytesIO(response_text.encode('utf-8')),
             filename=f'model_response_{message_id}.md'
         )
-        # Schedule file deletion
-        async def delete_temp_file():
-            await asyncio.sleep(1)  # Wait a bit to ensure file is sent
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                logging.error(f"Failed to delete temp file: {str(e)}")
-        asyncio.create_task(delete_temp_file())
-        return file
 
 async def setup(bot):
     # Register the cog with its proper name
@@ -26,38 +26,6 @@ class Claude1_1Cog(BaseCog):
         """Override qualified_name to match the expected cog name"""
         return "Claude-1.1"
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Handle incoming messages"""
-        if message.author == self.bot.user:
-            return
-
-        # Add message to context before processing
-        if self.context_cog:
-            try:
-                channel_id = str(message.channel.id)
-                guild_id = str(message.guild.id) if message.guild else None
-                user_id = str(message.author.id)
-                content = message.content
-                is_assistant = False
-                persona_name = self.name
-                emotion = None
-
-                await self.context_cog.add_message_to_context(
-                    channel_id=channel_id,
-                    guild_id=guild_id,
-                    user_id=user_id,
-                    content=content,
-                    is_assistant=is_assistant,
-                    persona_name=persona_name,
-                    emotion=emotion
-                )
-            except Exception as e:
-                logging.error(f"[Claude-1.1] Failed to add message to context: {str(e)}")
-
-        # Let base_cog handle image processing first
-        await super().handle_message(message)
-
 async def setup(bot):
     # Register the cog with its proper name
     try:
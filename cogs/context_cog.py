@@ -1,36 +1,20 @@
 import discord
 from discord.ext import commands
-from config import CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW, MAX_CONTEXT_WINDOW, OPENPIPE_API_KEY, OPENPIPE_API_URL
-import sqlite3
+from config import CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW, MAX_CONTEXT_WINDOW
 import json
 import logging
 from datetime import datetime, timedelta
 import asyncio
 from typing import List, Dict, Optional
 import textwrap
-from openai import OpenAI
+from shared.db import db
+from shared.api import api
 
 class ContextCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db_path = 'databases/interaction_logs.db'
-        self._setup_database()
         self.summary_chunk_hours = 24  # Summarize every 24 hours of chat
         self.last_summary_check = {}  # Track last summary generation per channel
-        self.openai_client = OpenAI(
-            base_url=OPENPIPE_API_URL,
-            api_key=OPENPIPE_API_KEY
-        )
-
-    def _setup_database(self):
-        """Ensure database and tables exist"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                # Load and execute schema if needed
-                with open('databases/schema.sql', 'r') as f:
-                    conn.executescript(f.read())
-        except Exception as e:
-            logging.error(f"Failed to setup database: {str(e)}")
 
     async def _generate_summary(self, messages: List[Dict]) -> str:
         """Generate a summary of chat messages using OpenAI/OpenPipe"""
@@ -50,7 +34,9 @@ class ContextCog(commands.Cog):
             system_prompt = "You are a helpful assistant that summarizes Discord chat conversations. Create a concise summary that captures the main points and key interactions of the conversation. Focus on the important topics discussed and any decisions or conclusions reached."
 
             # Make API call
-            completion = self.openai_client.chat.completions.create(
+            completion = await api.complete(
+                "openpipe",
+                cache=True,  # Re-checks often summarize the same window of messages
                 model="openpipe:moa-gpt-4o-v1",
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -70,64 +56,60 @@ class ContextCog(commands.Cog):
     async def _check_and_create_summary(self, channel_id: str):
         """Check if we need to create a new summary and create it if necessary"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Get the timestamp of the last summary
-                cursor.execute("""
-                    SELECT MAX(end_timestamp) FROM chat_summaries
-                    WHERE channel_id = ?
-                """, (channel_id,))
-                last_summary = cursor.fetchone()[0]
+            # Get the timestamp of the last summary
+            row = await db.fetchone("""
+                SELECT MAX(end_timestamp) FROM chat_summaries
+                WHERE channel_id = ?
+            """, (channel_id,))
+            last_summary = row[0]
+            
+            if last_summary:
+                last_summary = datetime.fromisoformat(last_summary)
+            else:
+                last_summary = datetime.now() - timedelta(hours=self.summary_chunk_hours)
+
+            # Get messages since last summary
+            rows = await db.fetchall("""
+                SELECT 
+                    timestamp, user_id, persona_name, 
+                    content, is_assistant, emotion
+                FROM messages
+                WHERE channel_id = ? AND timestamp > ?
+                ORDER BY timestamp ASC
+            """, (channel_id, last_summary.isoformat()))
+
+            messages = []
+            for row in rows:
+                messages.append({
+                    'timestamp': row[0],
+                    'user_id': row[1],
+                    'persona_name': row[2],
+                    'content': row[3],
+                    'is_assistant': bool(row[4]),
+                    'emotion': row[5]
+                })
+
+            if messages:
+                start_time = last_summary
+                end_time = datetime.fromisoformat(messages[-1]['timestamp'])
                 
-                if last_summary:
-                    last_summary = datetime.fromisoformat(last_summary)
-                else:
-                    last_summary = datetime.now() - timedelta(hours=self.summary_chunk_hours)
-
-                # Get messages since last summary
-                cursor.execute("""
-                    SELECT 
-                        timestamp, user_id, persona_name, 
-                        content, is_assistant, emotion
-                    FROM messages
-                    WHERE channel_id = ? AND timestamp > ?
-                    ORDER BY timestamp ASC
-                """, (channel_id, last_summary.isoformat()))
-
-                messages = []
-                for row in cursor.fetchall():
-                    messages.append({
-                        'timestamp': row[0],
-                        'user_id': row[1],
-                        'persona_name': row[2],
-                        'content': row[3],
-                        'is_assistant': bool(row[4]),
-                        'emotion': row[5]
-                    })
-
-                if messages:
-                    start_time = last_summary
-                    end_time = datetime.fromisoformat(messages[-1]['timestamp'])
+                # Only create summary if we have at least summary_chunk_hours worth of messages
+                if (end_time - start_time) >= timedelta(hours=self.summary_chunk_hours):
+                    summary = await self._generate_summary(messages)
                     
-                    # Only create summary if we have at least summary_chunk_hours worth of messages
-                    if (end_time - start_time) >= timedelta(hours=self.summary_chunk_hours):
-                        summary = await self._generate_summary(messages)
-                        
-                        cursor.execute("""
-                            INSERT INTO chat_summaries 
-                            (channel_id, start_timestamp, end_timestamp, summary)
-                            VALUES (?, ?, ?, ?)
-                        """, (channel_id, start_time.isoformat(), 
-                              end_time.isoformat(), summary))
-                        conn.commit()
+                    await db.execute("""
+                        INSERT INTO chat_summaries 
+                        (channel_id, start_timestamp, end_timestamp, summary)
+                        VALUES (?, ?, ?, ?)
+                    """, (channel_id, start_time.isoformat(), 
+                          end_time.isoformat(), summary))
 
         except Exception as e:
             logging.error(f"Failed to create summary: {str(e)}")
 
     @commands.Cog.listener()
     async def on_message(self, message):
-        """Capture user messages to add to context"""
+        """Capture user messages to add to context (the single owner of this write)"""
         if message.author.bot:
             return
 
@@ -140,7 +122,8 @@ class ContextCog(commands.Cog):
         emotion = None
 
         await self.add_message_to_context(channel_id, guild_id, user_id, content, 
-                                        is_assistant, persona_name, emotion)
+                                        is_assistant, persona_name, emotion,
+                                        discord_message_id=str(message.id))
         
         # Check if we need to create a new summary
         await self._check_and_create_summary(channel_id)
@@ -151,63 +134,58 @@ class ContextCog(commands.Cog):
             if limit is None:
                 limit = CONTEXT_WINDOWS.get(channel_id, DEFAULT_CONTEXT_WINDOW)
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-
-                # Get summaries
-                cursor.execute("""
-                    SELECT summary, end_timestamp
-                    FROM chat_summaries
-                    WHERE channel_id = ?
-                    ORDER BY end_timestamp DESC
-                """, (channel_id,))
-                summaries = cursor.fetchall()
-
-                # Get last 10 messages from both users and assistant
-                cursor.execute("""
-                    SELECT 
-                        timestamp,
-                        user_id,
-                        persona_name,
-                        content,
-                        is_assistant,
-                        emotion
-                    FROM messages
-                    WHERE channel_id = ?
-                    ORDER BY timestamp DESC
-                    LIMIT 10
-                """, (channel_id,))
-
-                recent_messages = []
-                for row in cursor.fetchall():
-                    recent_messages.append({
-                        'timestamp': row['timestamp'],
-                        'user_id': row['user_id'],
-                        'persona_name': row['persona_name'],
-                        'content': row['content'],
-                        'is_assistant': bool(row['is_assistant']),
-                        'emotion': row['emotion']
-                    })
-
-                # Combine summaries and recent messages
-                context = []
-                
-                # Add summaries first
-                for summary in summaries:
-                    context.append({
-                        'timestamp': summary['end_timestamp'],
-                        'user_id': 'SYSTEM',
-                        'persona_name': None,
-                        'content': f"[SUMMARY] {summary['summary']}",
-                        'is_assistant': False,
-                        'emotion': None
-                    })
-
-                # Add recent messages
-                context.extend(reversed(recent_messages))
-
-                return context
+            # Get summaries
+            summaries = await db.fetchall("""
+                SELECT summary, end_timestamp
+                FROM chat_summaries
+                WHERE channel_id = ?
+                ORDER BY end_timestamp DESC
+            """, (channel_id,))
+
+            # Get last 10 messages from both users and assistant
+            rows = await db.fetchall("""
+                SELECT 
+                    timestamp,
+                    user_id,
+                    persona_name,
+                    content,
+                    is_assistant,
+                    emotion
+                FROM messages
+                WHERE channel_id = ?
+                ORDER BY timestamp DESC, id DESC
+                LIMIT 10
+            """, (channel_id,))
+
+            recent_messages = []
+            for row in rows:
+                recent_messages.append({
+                    'timestamp': row[0],
+                    'user_id': row[1],
+                    'persona_name': row[2],
+                    'content': row[3],
+                    'is_assistant': bool(row[4]),
+                    'emotion': row[5]
+                })
+
+            # Combine summaries and recent messages
+            context = []
+            
+            # Add summaries first
+            for summary, end_timestamp in summaries:
+                context.append({
+                    'timestamp': end_timestamp,
+                    'user_id': 'SYSTEM',
+                    'persona_name': None,
+                    'content': f"[SUMMARY] {summary}",
+                    'is_assistant': False,
+                    'emotion': None
+                })
+
+            # Add recent messages
+            context.extend(reversed(recent_messages))
+
+            return context
 
         except Exception as e:
             logging.error(f"Failed to get context messages: {str(e)}")
@@ -216,21 +194,23 @@ class ContextCog(commands.Cog):
     async def add_message_to_context(self, channel_id: str, guild_id: Optional[str], 
                                    user_id: str, content: str, is_assistant: bool,
                                    persona_name: Optional[str] = None, 
-                                   emotion: Optional[str] = None) -> bool:
-        """Add a new message to the conversation context"""
+                                   emotion: Optional[str] = None,
+                                   discord_message_id: Optional[str] = None) -> bool:
+        """Add a new message to the conversation context (idempotent per Discord message ID)"""
         try:
             timestamp = datetime.now().isoformat()
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO messages (
-                        channel_id, guild_id, user_id, persona_name, 
-                        content, is_assistant, emotion, timestamp
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (channel_id, guild_id, user_id, persona_name, 
-                      content, is_assistant, emotion, timestamp))
-                conn.commit()
-                return True
+            # Write-behind: the row is committed with the next batch
+            await db.write("""
+                INSERT INTO messages (
+                    channel_id, guild_id, user_id, persona_name, 
+                    content, is_assistant, emotion, timestamp,
+                    discord_message_id
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(discord_message_id) DO NOTHING
+            """, (channel_id, guild_id, user_id, persona_name, 
+                  content, is_assistant, emotion, timestamp,
+                  discord_message_id))
+            return True
         except Exception as e:
             logging.error(f"Failed to add message to context: {str(e)}")
             return False
@@ -252,37 +232,33 @@ class ContextCog(commands.Cog):
         """Get chat summaries for this channel"""
         channel_id = str(ctx.channel.id)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
-                
-                cursor.execute("""
-                    SELECT summary, start_timestamp, end_timestamp
-                    FROM chat_summaries
-                    WHERE channel_id = ? AND end_timestamp > ?
-                    ORDER BY end_timestamp DESC
-                """, (channel_id, cutoff_time))
-                
-                summaries = cursor.fetchall()
-                
-                if not summaries:
-                    await ctx.reply("No summaries found for the specified time period.")
-                    return
-
-                response = "📝 Chat Summaries:\n\n"
-                for summary in summaries:
-                    start_time = datetime.fromisoformat(summary[1])
-                    end_time = datetime.fromisoformat(summary[2])
-                    response += f"From {start_time.strftime('%Y-%m-%d %H:%M')} to {end_time.strftime('%Y-%m-%d %H:%M')}:\n"
-                    response += f"{summary[0]}\n\n"
-
-                # Split response if it's too long
-                if len(response) > 2000:
-                    parts = textwrap.wrap(response, 2000)
-                    for part in parts:
-                        await ctx.reply(part)
-                else:
-                    await ctx.reply(response)
+            cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
+            
+            summaries = await db.fetchall("""
+                SELECT summary, start_timestamp, end_timestamp
+                FROM chat_summaries
+                WHERE channel_id = ? AND end_timestamp > ?
+                ORDER BY end_timestamp DESC
+            """, (channel_id, cutoff_time))
+            
+            if not summaries:
+                await ctx.reply("No summaries found for the specified time period.")
+                return
+
+            response = "📝 Chat Summaries:\n\n"
+            for summary in summaries:
+                start_time = datetime.fromisoformat(summary[1])
+                end_time = datetime.fromisoformat(summary[2])
+                response += f"From {start_time.strftime('%Y-%m-%d %H:%M')} to {end_time.strftime('%Y-%m-%d %H:%M')}:\n"
+                response += f"{summary[0]}\n\n"
+
+            # Split response if it's too long
+            if len(response) > 2000:
+                parts = textwrap.wrap(response, 2000)
+                for part in parts:
+                    await ctx.reply(part)
+            else:
+                await ctx.reply(response)
 
         except Exception as e:
             logging.error(f"Failed to get summaries: {str(e)}")
@@ -294,22 +270,19 @@ class ContextCog(commands.Cog):
         """Clear chat summaries for this channel"""
         channel_id = str(ctx.channel.id)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                if hours:
-                    cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
-                    cursor.execute("""
-                        DELETE FROM chat_summaries
-                        WHERE channel_id = ? AND end_timestamp < ?
-                    """, (channel_id, cutoff_time))
-                else:
-                    cursor.execute("""
-                        DELETE FROM chat_summaries
-                        WHERE channel_id = ?
-                    """, (channel_id,))
-                conn.commit()
-
-                await ctx.reply(f"🗑️ Cleared chat summaries{f' older than {hours} hours' if hours else ''}")
+            if hours:
+                cutoff_time = (datetime.now() - timedelta(hours=hours)).isoformat()
+                await db.execute("""
+                    DELETE FROM chat_summaries
+                    WHERE channel_id = ? AND end_timestamp < ?
+                """, (channel_id, cutoff_time))
+            else:
+                await db.execute("""
+                    DELETE FROM chat_summaries
+                    WHERE channel_id = ?
+                """, (channel_id,))
+
+            await ctx.reply(f"🗑️ Cleared chat summaries{f' older than {hours} hours' if hours else ''}")
         except Exception as e:
             logging.error(f"Failed to clear summaries: {str(e)}")
             await ctx.reply("❌ Failed to clear chat summaries")
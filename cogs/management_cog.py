@@ -4,6 +4,10 @@ import logging
 import shlex
 from datetime import datetime
 from .base_cog import BaseCog
+from shared.generations import generations
+from shared.metrics import metrics
+from shared.errors import circuit_breakers
+from shared.cache import response_cache
 
 class ManagementCog(commands.Cog):
     def __init__(self, bot):
@@ -135,5 +139,66 @@ class ManagementCog(commands.Cog):
             logging.error(f"Error cloning agent: {str(e)}")
             await ctx.send(f"❌ Failed to clone agent: {str(e)}")
 
+    @commands.command(name="cancel")
+    @commands.has_permissions(administrator=True)
+    async def cancel(self, ctx, message_id: int = None):
+        """Cancel in-flight responses
+        Usage: !cancel [message_id] (defaults to every response in this channel)"""
+        if message_id is not None:
+            cancelled = generations.cancel(message_id, reason=f"cancelled by {ctx.author}")
+        else:
+            cancelled = generations.cancel_channel(ctx.channel.id, reason=f"cancelled by {ctx.author}")
+
+        stats = generations.stats
+        summary = f"{stats['cancelled']} cancelled so far, saving ~{stats['tokens_saved']} tokens and ~{stats['seconds_saved']:.0f}s"
+        if not cancelled:
+            await ctx.send(f"ℹ️ No responses in progress to cancel. ({summary})")
+            return
+        agents = ", ".join(generation.agent_name for generation in cancelled)
+        await ctx.send(f"🛑 Cancelled {len(cancelled)} response(s) from {agents}. ({summary})")
+
+    @commands.command(name="stats")
+    @commands.has_permissions(administrator=True)
+    async def stats(self, ctx, *, match: str = None):
+        """Show latency percentiles per metric, provider and model
+        Usage: !stats [filter] (e.g. !stats ttft, !stats openpipe)"""
+        rows = metrics.rows(match)
+        counters = metrics.counter_rows(match)
+        if not rows and not counters:
+            await ctx.send("ℹ️ No metrics recorded yet.")
+            return
+
+        def fmt(value):
+            return "-" if value is None else f"{value:.0f}"
+
+        lines = [f"{'metric':<14} {'model':<36} {'n':>6} {'p50':>7} {'p90':>7} {'p99':>7}"]
+        for metric, provider, model, histogram in rows:
+            name = f"{provider}/{model}" if model else provider
+            lines.append(
+                f"{metric:<14} {name[-36:]:<36} {histogram.count:>6} "
+                f"{fmt(histogram.percentile(50)):>7} {fmt(histogram.percentile(90)):>7} {fmt(histogram.percentile(99)):>7}"
+            )
+        for counter, provider, model, value in counters:
+            name = f"{provider}/{model}" if model else provider
+            lines.append(f"{counter:<14} {name[-36:]:<36} {value:>6}")
+        for breaker in circuit_breakers.open_breakers():
+            if not match or match.lower() in f"circuit {breaker.name}".lower():
+                lines.append(f"{'circuit':<14} {breaker.name[-36:]:<36} {breaker.state:>6}")
+        cache_stats = response_cache.stats()
+        if cache_stats['hit_ratio'] is not None and (not match or match.lower() in "cache"):
+            lines.append(
+                f"{'cache':<14} {'hit ratio ' + format(cache_stats['hit_ratio'], '.0%'):<36} "
+                f"{cache_stats['memory_hits'] + cache_stats['sqlite_hits']:>6} hits, {cache_stats['misses']} misses"
+            )
+
+        # Keep each message inside Discord's 2000 character limit
+        chunk = []
+        for line in lines:
+            if sum(len(l) + 1 for l in chunk) + len(line) > 1900:
+                await ctx.send("```\n" + "\n".join(chunk) + "\n```")
+                chunk = []
+            chunk.append(line)
+        await ctx.send("```\n" + "\n".join(chunk) + "\n```\n(ms, except tokens_per_sec)")
+
 async def setup(bot):
     await bot.add_cog(ManagementCog(bot))
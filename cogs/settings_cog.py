@@ -4,6 +4,7 @@ from discord import app_commands
 import json
 import logging
 import os
+from shared.config_cache import set_dynamic_prompt, reset_dynamic_prompt
 
 class SettingsCog(commands.Cog):
     def __init__(self, bot):
@@ -24,30 +25,12 @@ class SettingsCog(commands.Cog):
     ):
         """Set a custom system prompt for an AI agent in the current channel"""
         try:
-            # Load existing prompts
-            if os.path.exists(self.dynamic_prompts_file):
-                with open(self.dynamic_prompts_file, "r") as f:
-                    dynamic_prompts = json.load(f)
-            else:
-                dynamic_prompts = {}
-
             # Get guild and channel IDs
             guild_id = str(interaction.guild.id) if interaction.guild else None
             channel_id = str(interaction.channel.id)
 
-            # Initialize guild dict if needed
-            if guild_id and guild_id not in dynamic_prompts:
-                dynamic_prompts[guild_id] = {}
-
-            # Set the prompt
-            if guild_id:
-                dynamic_prompts[guild_id][channel_id] = prompt
-            else:
-                dynamic_prompts[channel_id] = prompt
-
-            # Save updated prompts
-            with open(self.dynamic_prompts_file, "w") as f:
-                json.dump(dynamic_prompts, f, indent=4)
+            # Set the prompt and save (also refreshes the in-memory cache)
+            set_dynamic_prompt(guild_id, channel_id, prompt)
 
             await interaction.response.send_message(f"✅ System prompt updated for {agent} in this channel.", ephemeral=True)
 
@@ -71,24 +54,11 @@ class SettingsCog(commands.Cog):
                 await interaction.response.send_message("No custom prompts found.", ephemeral=True)
                 return
 
-            with open(self.dynamic_prompts_file, "r") as f:
-                dynamic_prompts = json.load(f)
-
             guild_id = str(interaction.guild.id) if interaction.guild else None
             channel_id = str(interaction.channel.id)
 
-            # Remove prompt if it exists
-            if guild_id and guild_id in dynamic_prompts:
-                if channel_id in dynamic_prompts[guild_id]:
-                    del dynamic_prompts[guild_id][channel_id]
-                    if not dynamic_prompts[guild_id]:  # Remove guild if empty
-                        del dynamic_prompts[guild_id]
-            elif channel_id in dynamic_prompts:
-                del dynamic_prompts[channel_id]
-
-            # Save updated prompts
-            with open(self.dynamic_prompts_file, "w") as f:
-                json.dump(dynamic_prompts, f, indent=4)
+            # Remove prompt if it exists and save (also refreshes the in-memory cache)
+            reset_dynamic_prompt(guild_id, channel_id)
 
             await interaction.response.send_message(f"✅ System prompt reset to default for {agent} in this channel.", ephemeral=True)
 
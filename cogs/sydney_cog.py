@@ -27,93 +27,10 @@ class SydneyCog(BaseCog):
         """Override qualified_name to match the expected cog name"""
         return "Sydney"
 
-    async def generate_response(self, message):
-        """Generate a response using OpenRouter"""
-        try:
-            # Format system prompt
-            formatted_prompt = self.format_system_prompt(message)
-            messages = [{"role": "system", "content": formatted_prompt}]
-
-            # Get last 50 messages from database
-            channel_id = str(message.channel.id)
-            history_messages = await self.context_cog.get_context_messages(channel_id, limit=50)
-            messages.extend(history_messages)
-
-            # Add current message with any image descriptions
-            if message.attachments:
-                # Get alt text for this message
-                alt_text = await self.context_cog.get_alt_text(str(message.id))
-                if alt_text:
-                    messages.append({
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": message.content},
-                            {"type": "text", "text": f"Image description: {alt_text}"}
-                        ]
-                    })
-                else:
-                    messages.append({
-                        "role": "user",
-                        "content": message.content
-                    })
-            else:
-                messages.append({
-                    "role": "user",
-                    "content": message.content
-                })
-
-            logging.debug(f"[Sydney] Sending {len(messages)} messages to API")
-            logging.debug(f"[Sydney] Formatted prompt: {formatted_prompt}")
-
-            # Get temperature for this agent
-            temperature = self.get_temperature(self.name)
-            logging.debug(f"[Sydney] Using temperature: {temperature}")
-
-            # Call OpenRouter API and return the stream directly
-            response_stream = await self.api_client.call_openrouter(
-                messages=messages,
-                model=self.model,
-                temperature=temperature,
-                stream=True
-            )
-
-            return response_stream
-
-        except Exception as e:
-            logging.error(f"Error processing message for Sydney: {str(e)}")
-            return None
-
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Handle incoming messages"""
-        if message.author == self.bot.user:
-            return
-
-        # Add message to context before processing
-        if self.context_cog:
-            try:
-                channel_id = str(message.channel.id)
-                guild_id = str(message.guild.id) if message.guild else None
-                user_id = str(message.author.id)
-                content = message.content
-                is_assistant = False
-                persona_name = self.name
-                emotion = None
-
-                await self.context_cog.add_message_to_context(
-                    channel_id=channel_id,
-                    guild_id=guild_id,
-                    user_id=user_id,
-                    content=content,
-                    is_assistant=is_assistant,
-                    persona_name=persona_name,
-                    emotion=emotion
-                )
-            except Exception as e:
-                logging.error(f"[Sydney] Failed to add message to context: {str(e)}")
-
-        # Let base_cog handle message processing
-        await super().handle_message(message)
+    async def get_history(self, message, budget):
+        """Use ContextCog's history, trimmed to the prompt budget"""
+        history_messages = await self.context_cog.get_context_messages(str(message.channel.id), limit=50)
+        return budget.fit(history_messages)
 
 async def setup(bot):
     # Register the cog with its proper name
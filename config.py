@@ -21,6 +21,11 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'sk-dummy-openai-api-key')
 
 # Logging level
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# Longest value a structured log field prints, and the fraction of debug/info lines kept per log category
+LOG_MAX_FIELD_CHARS = 300
+LOG_SAMPLE_RATES = {
+    "API.payload": 0.1,
+}
 
 # Context windows (can be updated dynamically)
 CONTEXT_WINDOWS = {}
@@ -31,6 +36,79 @@ DEFAULT_CONTEXT_WINDOW = 10
 # Maximum context window
 MAX_CONTEXT_WINDOW = 50
 
+# Prompt assembly: most prompt tokens per request even for long-context models (smaller prompts start answering sooner
+# and cost less), the most one history message may use before it is truncated, and history rows read per page
+CONTEXT_MAX_PROMPT_TOKENS = 6000
+HISTORY_MESSAGE_MAX_TOKENS = 800
+HISTORY_PAGE_SIZE = 20
+
+# Write-behind database queue: commit every N rows or M milliseconds, bounded queue for backpressure
+DB_WRITE_BATCH_SIZE = 100
+DB_WRITE_BATCH_MS = 50
+DB_WRITE_QUEUE_SIZE = 1000
+
+# Background API request reporting: bounded queue, batch size, and what to do when saturated ('drop' or 'sample')
+REPORT_QUEUE_SIZE = 500
+REPORT_BATCH_SIZE = 50
+REPORT_OVERFLOW_POLICY = os.getenv('REPORT_OVERFLOW_POLICY', 'drop')
+REPORT_SAMPLE_RATE = float(os.getenv('REPORT_SAMPLE_RATE', '0.1'))
+
+# Streamed reply edits: seconds between edits per channel, backed off up to the max when Discord throttles us
+EDIT_MIN_INTERVAL = 1.0
+EDIT_MAX_INTERVAL = 8.0
+EDIT_SLOW_SECONDS = 1.5
+
+# Latency histograms are dumped to this file every METRICS_DUMP_SECONDS for scraping
+METRICS_FILE = os.getenv('METRICS_FILE', 'metrics.json')
+METRICS_DUMP_SECONDS = 60
+
+# Streaming watchdog: seconds to wait for the first token and between chunks before the stream counts as stalled
+STREAM_FIRST_TOKEN_TIMEOUT = 30.0
+STREAM_CHUNK_TIMEOUT = 15.0
+# Per-model (first token, between chunks) overrides; reasoning models think before they answer
+STREAM_TIMEOUTS = {
+    "openai/o1-mini": (120.0, 30.0),
+}
+# Hedged requests for agents with fallback_models: hedge once the first token is later than this percentile of the
+# model's observed TTFT (needs HEDGE_MIN_SAMPLES observations, HEDGE_COLD_DELAY seconds until then), never sooner than HEDGE_MIN_DELAY
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 2.0
+HEDGE_COLD_DELAY = 10.0
+
+# Completion response cache: in-memory LRU entries, default TTL in seconds, rows kept in sqlite, and writes between prunes
+RESPONSE_CACHE_SIZE = 512
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+RESPONSE_CACHE_DB_MAX_ENTRIES = 10000
+RESPONSE_CACHE_PRUNE_EVERY = 100
+
+# Shared HTTP pool for LLM providers: per-host connection limits, keep-alive, timeouts, and how often idle connections are kept warm
+HTTP_MAX_CONNECTIONS_PER_HOST = 20
+HTTP_MAX_KEEPALIVE_PER_HOST = 10
+HTTP_KEEPALIVE_SECONDS = 120.0
+HTTP_CONNECT_TIMEOUT = 10.0
+HTTP_READ_TIMEOUT = 120.0
+HTTP_PREWARM_SECONDS = 90
+
+# Admission control: (max concurrent requests, requests per minute) per provider and per model.
+# Models without an entry use the default, or the stricter free limits for ':free' models
+PROVIDER_LIMITS = {
+    "openrouter": (32, 200),
+    "openpipe": (16, 120),
+}
+MODEL_LIMITS = {}
+DEFAULT_MODEL_LIMITS = (8, 60)
+FREE_MODEL_LIMITS = (2, 20)
+# Longest a request queues for admission before giving up
+LIMITER_MAX_WAIT = 30.0
+
+# Retries for retryable provider errors (429, 5xx, connection failures), with full-jitter exponential backoff
+RETRY_MAX_TRIES = 3
+RETRY_MAX_TIME = 20.0
+# Per-model circuit breaker: consecutive provider failures before failing fast, and seconds before probing again
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
 # Other configuration variables can be added here as needed
 # Error Messages
 ERROR_MESSAGES = {
@@ -38,6 +116,7 @@ ERROR_MESSAGES = {
     'invalid_api_key': "🔑 Invalid API key. Please contact the bot administrator.",
     'rate_limit': "⏳ Rate limit exceeded. Please try again later.",
     'network_error': "🌐 Network error. Please try again later.",
+    'provider_unavailable': "🛠️ This model is temporarily unavailable. Please try again later.",
     'unknown_error': "❌ An error occurred. Please try again later.",
     'reporting_error': "📝 Unable to log interaction, but response was successful."
 }
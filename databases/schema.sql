@@ -1,3 +1,5 @@
+-- Baseline schema (migration 1). Later changes are versioned in shared/migrations.py
+
 -- Messages table to store all interactions
 CREATE TABLE IF NOT EXISTS messages (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -10,6 +12,7 @@ CREATE TABLE IF NOT EXISTS messages (
     is_assistant BOOLEAN NOT NULL,
     parent_message_id INTEGER,
     emotion TEXT,
+    discord_message_id TEXT,
     FOREIGN KEY (parent_message_id) REFERENCES messages(id)
 );
 
@@ -39,11 +42,23 @@ CREATE TABLE IF NOT EXISTS chat_summaries (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
+-- API request/response logs
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    requested_at INTEGER,
+    received_at INTEGER,
+    request TEXT,
+    response TEXT,
+    status_code INTEGER,
+    tags TEXT
+);
+
 -- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_messages_channel ON messages(channel_id);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_timestamp ON messages(channel_id, timestamp, id);
 CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
 CREATE INDEX IF NOT EXISTS idx_messages_user ON messages(user_id);
 CREATE INDEX IF NOT EXISTS idx_messages_persona ON messages(persona_name);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_discord_id ON messages(discord_message_id);
 CREATE INDEX IF NOT EXISTS idx_alt_text_channel ON image_alt_text(channel_id);
-CREATE INDEX IF NOT EXISTS idx_summaries_channel ON chat_summaries(channel_id);
+CREATE INDEX IF NOT EXISTS idx_summaries_channel_end ON chat_summaries(channel_id, end_timestamp);
 CREATE INDEX IF NOT EXISTS idx_summaries_timestamp ON chat_summaries(end_timestamp);
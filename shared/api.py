@@ -2,74 +2,375 @@ import os
 import logging
 import time
 import json
+import random
 import asyncio
-import sqlite3
-from typing import Dict, Any, List, Union, AsyncGenerator
-import aiohttp
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union, AsyncGenerator
+import httpx
 import backoff
 from urllib.parse import urlparse, urljoin
-from config import OPENPIPE_API_KEY, OPENROUTER_API_KEY, OPENPIPE_API_URL
+from config import OPENPIPE_API_KEY, OPENROUTER_API_KEY, OPENPIPE_API_URL, REPORT_QUEUE_SIZE, REPORT_BATCH_SIZE, REPORT_OVERFLOW_POLICY, REPORT_SAMPLE_RATE
+from config import STREAM_FIRST_TOKEN_TIMEOUT, STREAM_CHUNK_TIMEOUT, STREAM_TIMEOUTS
+from config import HTTP_MAX_CONNECTIONS_PER_HOST, HTTP_MAX_KEEPALIVE_PER_HOST, HTTP_KEEPALIVE_SECONDS, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from config import RETRY_MAX_TRIES, RETRY_MAX_TIME
+from config import HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY, HEDGE_COLD_DELAY
 from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from shared.db import db
+from shared.metrics import metrics, StreamTimer
+from shared.limits import limits
+from shared.cache import response_cache, cache_key
+from shared.models import max_output_tokens
+from shared.log import get_logger, describe_messages
+from shared.errors import ProviderError, RateLimited, StreamStalled, classify_error, circuit_breakers
+
+
+OPENROUTER_API_URL = "https://openrouter.ai/api/v1"
+
+log = get_logger("API")
+# Full request payloads; sampled through LOG_SAMPLE_RATES
+payload_log = get_logger("API.payload")
+
+def build_http_client(base_urls: List[str]) -> httpx.AsyncClient:
+    """
+    One HTTP/2 httpx client (h2 comes with httpx[http2]) for every provider,
+    with a separately mounted (and so separately limited) connection pool
+    per provider host
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS
+    )
+    mounts = {}
+    for base_url in base_urls:
+        parsed = urlparse(base_url)
+        mounts[f"{parsed.scheme}://{parsed.netloc}"] = httpx.AsyncHTTPTransport(limits=limits, http2=True)
+    return httpx.AsyncClient(
+        mounts=mounts,
+        limits=limits,
+        http2=True,
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        follow_redirects=True
+    )
+
+def get_stream_timeouts(model: str):
+    """(first token, between chunks) watchdog timeouts for a model"""
+    return STREAM_TIMEOUTS.get(model, (STREAM_FIRST_TOKEN_TIMEOUT, STREAM_CHUNK_TIMEOUT))
+
+def get_hedge_delay(provider: str, model: str) -> float:
+    """Seconds to wait for a model's first token before hedging: its observed p95 TTFT once there's enough data"""
+    histogram = metrics.get('ttft', provider, model)
+    if histogram is None or histogram.count < HEDGE_MIN_SAMPLES:
+        return HEDGE_COLD_DELAY
+    # Floored so a run of fast answers can't make every request hedge
+    return max(histogram.percentile(HEDGE_PERCENTILE) / 1000, HEDGE_MIN_DELAY)
 
 class API:
     def __init__(self):
-        # Initialize aiohttp session
-        self.session = aiohttp.ClientSession()
-        
+        # Shared connection pool for every provider client (httpx binds to the loop on first use)
+        self.base_urls = [OPENROUTER_API_URL, OPENPIPE_API_URL]
+        self.http_client = build_http_client(self.base_urls)
+
         # Initialize OpenPipe client
         self.openpipe_client = AsyncOpenAI(
             api_key=OPENPIPE_API_KEY,
-            base_url=OPENPIPE_API_URL
+            base_url=OPENPIPE_API_URL,
+            http_client=self.http_client,
+            max_retries=0  # Retries are handled by _create_completion's policy
         )
 
         # Initialize OpenRouter client
         self.openrouter_client = AsyncOpenAI(
             api_key=OPENROUTER_API_KEY,
-            base_url="https://openrouter.ai/api/v1"
+            base_url=OPENROUTER_API_URL,
+            http_client=self.http_client,
+            max_retries=0  # Retries are handled by _create_completion's policy
         )
 
-        # Connect to SQLite database and apply schema
+        # Deterministic requests currently in flight, by cache key, so identical concurrent calls share one
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        # Background reporting pipeline (started lazily inside the running loop)
+        self._report_queue = None
+        self._report_task = None
+        self.report_stats = {'queued': 0, 'written': 0, 'failed': 0, 'dropped': 0}
+
+    @backoff.on_exception(
+        backoff.expo,
+        ProviderError,
+        giveup=lambda e: not e.retryable,
+        jitter=backoff.full_jitter,
+        max_tries=RETRY_MAX_TRIES,
+        max_time=RETRY_MAX_TIME,
+        giveup_log_level=logging.WARNING  # Each failure is already logged below
+    )
+    async def _create_completion(self, provider, **kwargs):
+        """
+        Create a chat completion (or open a stream) with retries for retryable
+        errors, failing fast while the model's circuit breaker is open. Errors
+        are raised as ProviderError subclasses. For streams this only covers
+        the request itself, so nothing is retried after the first chunk.
+        Callers hold a limits.slot(); every attempt takes its own rate limit
+        token, so a retry after a 429 waits until the provider's Retry-After.
+        on_send, if given, is called as each attempt is actually sent.
+        """
+        on_send = kwargs.pop('on_send', None)
+        model = kwargs['model']
+        breaker = circuit_breakers.get(provider, model)
+        breaker.check(provider, model)
         try:
-            self.db_conn = sqlite3.connect('databases/interaction_logs.db')
-            self.db_cursor = self.db_conn.cursor()
-            self._apply_schema()
-            logging.info("[API] Connected to database and applied schema")
+            await limits.acquire(provider, model)
+        except BaseException:
+            # Nothing was sent, so give back the half-open probe if this request had claimed it
+            breaker.abandon()
+            raise
+        client = self.openpipe_client if provider == "openpipe" else self.openrouter_client
+        if on_send is not None:
+            on_send()
+        try:
+            raw = await client.chat.completions.with_raw_response.create(**kwargs)
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
         except Exception as e:
-            logging.error(f"[API] Failed to connect to database or apply schema: {str(e)}")
-            self.db_conn = None
-            self.db_cursor = None
+            error = classify_error(e, provider, model)
+            if isinstance(error, RateLimited):
+                limits.record_rate_limited(provider, model, e.response.headers)
+            if error.trips_breaker:
+                breaker.record_failure()
+            else:
+                # The provider answered, so it is up even if it rejected this request
+                breaker.record_success()
+            metrics.increment(f'error_{type(error).__name__}', provider, model)
+            logging.warning(f"[API] {provider}/{model} request failed ({type(error).__name__}, retryable={error.retryable}): {str(e)}")
+            raise error from e
+        breaker.record_success()
+        limits.record_success(provider, model, raw.headers)
+        return raw.parse()
+
+    async def complete(self, provider, cache: Optional[bool] = None, cache_ttl: Optional[float] = None, **kwargs):
+        """
+        Non-streaming chat completion with admission control; kwargs go straight to the client.
+        Responses are served from the response cache when cache=True, or by default when the
+        request is deterministic (temperature 0), and identical cacheable requests made while
+        one is already in flight wait for its result instead of calling the provider again
+        """
+        completion, _ = await self._complete(provider, cache, cache_ttl, **kwargs)
+        return completion
+
+    async def _complete(self, provider, cache: Optional[bool], cache_ttl: Optional[float], **kwargs) -> Tuple[ChatCompletion, bool]:
+        """complete(), plus whether this call sent the request (False for cache hits and shared in-flight requests)"""
+        if cache is None:
+            cache = kwargs.get('temperature') == 0
+        if not cache:
+            async with limits.slot(provider, kwargs['model']):
+                return await self._create_completion(provider, **kwargs), True
+
+        key = cache_key(provider, **kwargs)
+        task = self._in_flight.get(key)
+        sent = False
+        if task is not None:
+            metrics.increment('single_flight_shared', provider, kwargs['model'])
+        else:
+            cached = await response_cache.get(key, kwargs['model'])
+            if cached is not None:
+                return ChatCompletion.model_validate_json(cached), False
+            # Another caller may have started the request while we checked the sqlite tier
+            task = self._in_flight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._complete_and_cache(key, provider, cache_ttl, **kwargs))
+                self._in_flight[key] = task
+                task.add_done_callback(lambda done: self._forget_in_flight(key, done))
+                sent = True
+            else:
+                metrics.increment('single_flight_shared', provider, kwargs['model'])
+        # Shielded so one caller being cancelled doesn't fail the request for everyone sharing it
+        return await asyncio.shield(task), sent
+
+    def _forget_in_flight(self, key, task):
+        self._in_flight.pop(key, None)
+        # Retrieve the error so it isn't reported as unhandled when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def _complete_and_cache(self, key, provider, cache_ttl, **kwargs):
+        async with limits.slot(provider, kwargs['model']):
+            completion = await self._create_completion(provider, **kwargs)
+        await response_cache.set(key, completion.model_dump_json(), kwargs['model'], cache_ttl)
+        return completion
+
+    def _open_stream(self, provider, messages, model, temperature, max_tokens):
+        if provider == "openpipe":
+            return self._stream_openpipe_request(messages, model, temperature, max_tokens)
+        return self._stream_openrouter_request(messages, model, temperature, max_tokens)
+
+    async def _watch_stream(self, provider, messages, model, temperature, max_tokens):
+        """
+        Relay a stream, aborting it with StreamStalled if the first token or
+        the next chunk takes longer than the model's watchdog timeout. Failing
+        over is up to _hedged_stream, for agents with their own fallback_models.
+        """
+        first_token_timeout, chunk_timeout = get_stream_timeouts(model)
+        partial = ""
+        failure = None
+        # The slot is held until the stream ends
+        async with limits.slot(provider, model):
+            stream = self._open_stream(provider, messages, model, temperature, max_tokens)
+            try:
+                # Rate limit waits and retries happen while the request is opened, before the watchdog
+                # starts; each attempt is bounded by its own HTTP timeout instead
+                await stream.__anext__()
+                while True:
+                    try:
+                        # Cancelling the pending __anext__ on timeout closes the upstream response
+                        chunk = await asyncio.wait_for(stream.__anext__(), chunk_timeout if partial else first_token_timeout)
+                    except StopAsyncIteration:
+                        return
+                    except asyncio.TimeoutError:
+                        stage = "between chunks" if partial else "before the first token"
+                        failure = StreamStalled(f"{model} stalled {stage}", provider, model)
+                        metrics.increment('stall', provider, model)
+                        circuit_breakers.get(provider, model).record_failure()
+                        break
+                    partial += chunk
+                    yield chunk
+            finally:
+                await stream.aclose()
+
+        raise failure
+
+    async def _hedged_stream(self, provider, messages, model, temperature, max_tokens, fallback_models: Sequence[Tuple[str, str]]):
+        """
+        Relay a stream from the first model in the chain to deliver a token.
+        Whenever the newest request goes longer than its model's p95 time to
+        first token (or fails), a hedged request goes to the next model in
+        fallback_models. The first stream to produce a chunk wins and the
+        others are cancelled, which closes their HTTP responses. If the winner
+        stalls mid-reply, the next model in the chain continues from the text
+        received so far (sent as an assistant prefill), once.
+        """
+        chain = [(provider, model)] + [tuple(fallback) for fallback in fallback_models if tuple(fallback) != (provider, model)]
+        metrics.increment('hedge_eligible', provider, model)
+        started = time.monotonic()
+        pending = {}  # __anext__ task -> (provider, model, stream)
+        next_index = 0
+        hedge_at = None
+        failure = None
+        winner = None
+        first_chunk = ""
+
+        def launch():
+            nonlocal next_index, hedge_at
+            candidate_provider, candidate_model = chain[next_index]
+            next_index += 1
+            stream = self._watch_stream(candidate_provider, messages, candidate_model, temperature, max_tokens)
+            pending[asyncio.ensure_future(stream.__anext__())] = (candidate_provider, candidate_model, stream)
+            hedge_at = time.monotonic() + get_hedge_delay(candidate_provider, candidate_model)
 
-    def _apply_schema(self):
         try:
-            with open('databases/schema.sql', 'r') as schema_file:
-                schema_sql = schema_file.read()
-            self.db_cursor.executescript(schema_sql)
-            self.db_conn.commit()
-            logging.info("[API] Successfully applied database schema")
-        except Exception as e:
-            logging.error(f"[API] Failed to apply database schema: {str(e)}")
-            raise
+            launch()
+            while winner is None:
+                if not pending:
+                    if next_index >= len(chain):
+                        raise failure
+                    # Everything in flight failed, so move down the chain without waiting
+                    launch()
+                timeout = max(hedge_at - time.monotonic(), 0) if next_index < len(chain) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The newest request is slower than its model usually is, so hedge
+                    hedge_provider, hedge_model = chain[next_index]
+                    logging.info(f"[API] No first token from {provider}/{model} after {time.monotonic() - started:.1f}s, hedging with {hedge_provider}/{hedge_model}")
+                    metrics.increment('hedge', provider, model)
+                    launch()
+                    continue
+                for task in done:
+                    candidate = pending.pop(task)
+                    try:
+                        chunk = task.result()
+                    except StopAsyncIteration:
+                        chunk = ""
+                    except ProviderError as e:
+                        logging.warning(f"[API] {candidate[0]}/{candidate[1]} failed before its first token: {str(e)}")
+                        failure = e
+                        continue
+                    if winner is None:
+                        winner, first_chunk = candidate, chunk
+                    else:
+                        await candidate[2].aclose()
+        finally:
+            # Cancel the losers; cancelling a pending __anext__ unwinds the stream and closes its HTTP response
+            for task in pending:
+                task.cancel()
+            for task, (_, _, loser) in pending.items():
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await loser.aclose()
+
+        winner_provider, winner_model, stream = winner
+        if (winner_provider, winner_model) != (provider, model):
+            won_after = time.monotonic() - started
+            metrics.increment('hedge_win', winner_provider, winner_model)
+            # Estimate the saving from the primary's usual tail, since its real TTFT was never seen
+            primary_ttft = metrics.get('ttft', provider, model)
+            expected = primary_ttft.percentile(99) / 1000 if primary_ttft else won_after
+            metrics.observe('hedge_saved', max(expected - won_after, 0) * 1000, provider, model)
+            logging.info(f"[API] {winner_provider}/{winner_model} answered first after {won_after:.1f}s, replacing {provider}/{model}")
+
+        partial = first_chunk
+        try:
+            if first_chunk:
+                yield first_chunk
+            async for chunk in stream:
+                partial += chunk
+                yield chunk
+            return
+        except StreamStalled as e:
+            failure = e
+        finally:
+            await stream.aclose()
+
+        index = chain.index((winner_provider, winner_model))
+        others = chain[index + 1:] + chain[:index]
+        if not others:
+            raise failure
+        fallback_provider, fallback_model = others[0]
+        logging.warning(f"[API] {winner_provider}/{winner_model} failed ({str(failure)}) after {len(partial)} chars, failing over to {fallback_provider}/{fallback_model}")
+        metrics.increment('failover', winner_provider, winner_model)
+        messages = messages + [{"role": "assistant", "content": partial}]
+        async for chunk in self._watch_stream(fallback_provider, messages, fallback_model, temperature, max_tokens):
+            yield chunk
 
     async def _stream_openrouter_request(self, messages, model, temperature, max_tokens):
         """Stream responses from OpenRouter API using OpenAI client"""
-        logging.debug(f"[API] Making OpenRouter streaming request to model: {model}")
-        
+        log.debug("OpenRouter streaming request", model=model)
+
+        stream = None
+        timer = StreamTimer("openrouter", model)
+        requested_at = int(time.time() * 1000)
         try:
-            stream = await self.openrouter_client.chat.completions.create(
+            stream = await self._create_completion(
+                "openrouter",
+                on_send=timer.sent,
                 model=model,
                 messages=messages,
                 temperature=temperature if temperature is not None else 1,
                 max_tokens=max_tokens,
                 stream=True,
-                store=True
+                store=True,
+                timeout=httpx.Timeout(get_stream_timeouts(model)[0], connect=HTTP_CONNECT_TIMEOUT)
             )
-            requested_at = int(time.time() * 1000)
-            
+            yield ""  # Opened: _watch_stream starts its first-token watchdog now
+
             async for chunk in stream:
                 if chunk.choices[0].delta.content:
+                    timer.chunk()
                     yield chunk.choices[0].delta.content
 
             received_at = int(time.time() * 1000)
+            timings = timer.finish()
 
             # Log request to database after completion
             completion_obj = {
@@ -90,20 +391,17 @@ class API:
                 },
                 resp_payload=completion_obj,
                 status_code=200,
-                tags={"source": "openrouter"}
+                tags={"source": "openrouter", **timings}
             )
         except Exception as e:
-            error_message = str(e)
-            logging.error(f"[API] OpenRouter streaming error: {error_message}")
-            raise Exception(f"OpenRouter API error: {error_message}")
+            logging.error(f"[API] OpenRouter streaming error: {str(e)}")
+            raise classify_error(e, "openrouter", model) from e
+        finally:
+            # Close the HTTP response whether the stream finished, failed, or was cancelled mid-way
+            if stream is not None:
+                await stream.close()
 
-    @backoff.on_exception(
-        backoff.expo,
-        (aiohttp.ClientError, asyncio.TimeoutError),
-        max_tries=5,
-        max_time=60
-    )
-    async def call_openrouter(self, messages: List[Dict[str, Union[str, List[Dict[str, Any]]]]], model: str, temperature: float = None, stream: bool = False) -> Union[Dict, AsyncGenerator[str, None]]:
+    async def call_openrouter(self, messages: List[Dict[str, Union[str, List[Dict[str, Any]]]]], model: str, temperature: float = None, stream: bool = False, fallback_models: Optional[Sequence[Tuple[str, str]]] = None, cache: Optional[bool] = None) -> Union[Dict, AsyncGenerator[str, None]]:
         try:
             # Check if any message contains vision content
             has_vision_content = any(
@@ -111,35 +409,30 @@ class API:
                 any(content.get('type') == 'image_url' for content in msg['content'])
                 for msg in messages
             )
-            logging.debug(f"[API] Message contains vision content: {has_vision_content}")
 
             # Configure parameters based on content type
-            max_tokens = 2000 if has_vision_content else 1000
+            max_tokens = max_output_tokens(model, vision=has_vision_content)
             
             # Use provided temperature or default based on content type
             if temperature is None:
                 temperature = 0.5 if has_vision_content else 0.7
-            logging.debug(f"[API] Using max_tokens={max_tokens}, temperature={temperature}")
-
-            # Log request details
-            logging.debug(f"[API] OpenRouter request messages structure:")
-            for msg in messages:
-                if isinstance(msg.get('content'), list):
-                    logging.debug(f"[API] Message type: multimodal")
-                    text_parts = [c['text'] for c in msg['content'] if c['type'] == 'text']
-                    image_parts = [c for c in msg['content'] if c['type'] == 'image_url']
-                    logging.debug(f"[API] Text parts: {text_parts}")
-                    logging.debug(f"[API] Number of images: {len(image_parts)}")
-                else:
-                    logging.debug(f"[API] Message type: text")
-                    logging.debug(f"[API] Content: {msg.get('content')}")
+
+            # Log request details (the message summary and payload are only built if debug logging is on)
+            log.debug("OpenRouter request", model=model, vision=has_vision_content, max_tokens=max_tokens,
+                      temperature=temperature, messages=lambda: describe_messages(messages))
+            payload_log.debug("OpenRouter request payload", model=model, messages=lambda: messages)
 
             if stream:
-                return self._stream_openrouter_request(messages, model, temperature, max_tokens)
+                if fallback_models:
+                    return self._hedged_stream("openrouter", messages, model, temperature, max_tokens, fallback_models)
+                return self._watch_stream("openrouter", messages, model, temperature, max_tokens)
             else:
                 # Non-streaming request
                 requested_at = int(time.time() * 1000)
-                response = await self.openrouter_client.chat.completions.create(
+                response, sent = await self._complete(
+                    "openrouter",
+                    cache,
+                    None,
                     model=model,
                     messages=messages,
                     temperature=temperature,
@@ -155,6 +448,10 @@ class API:
                         }
                     }]
                 }
+                if not sent:
+                    # Served from the cache or another caller's identical request: no provider latency or request to log
+                    return result
+                metrics.observe('total', received_at - requested_at, "openrouter", model)
 
                 # Log the interaction
                 await self.report(
@@ -174,43 +471,38 @@ class API:
                 return result
 
         except Exception as e:
-            error_message = str(e)
-            if "insufficient_quota" in error_message.lower():
-                logging.error("[API] OpenRouter credits depleted")
-                raise Exception("⚠️ OpenRouter credits depleted. Please visit https://openrouter.ai/credits to add more.")
-            elif "invalid_api_key" in error_message.lower():
-                logging.error("[API] Invalid OpenRouter API key")
-                raise Exception("🔑 Invalid OpenRouter API key. Please check your configuration.")
-            elif "rate_limit_exceeded" in error_message.lower():
-                logging.error("[API] OpenRouter rate limit exceeded")
-                raise Exception("⏳ Rate limit exceeded. Please try again later.")
-            elif isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
-                logging.error(f"[API] Connection error: {str(e)}")
-                raise Exception("🌐 Connection error. Please check your internet connection and try again.")
-            else:
-                logging.error(f"[API] OpenRouter error: {error_message}")
-                raise Exception(f"OpenRouter API error: {error_message}")
+            error = classify_error(e, "openrouter", model)
+            logging.error(f"[API] OpenRouter error ({type(error).__name__}): {str(e)}")
+            raise error from e
 
     async def _stream_openpipe_request(self, messages, model, temperature, max_tokens):
         """Stream responses from OpenPipe API"""
-        logging.debug(f"[API] Making OpenPipe streaming request to model: {model}")
-        
+        log.debug("OpenPipe streaming request", model=model)
+
+        stream = None
+        timer = StreamTimer("openpipe", model)
+        requested_at = int(time.time() * 1000)
         try:
-            stream = await self.openpipe_client.chat.completions.create(
+            stream = await self._create_completion(
+                "openpipe",
+                on_send=timer.sent,
                 model=model,
                 messages=messages,
                 temperature=temperature if temperature is not None else 0.7,
-                max_tokens=max_tokens if max_tokens is not None else 1000,
+                max_tokens=max_tokens if max_tokens is not None else max_output_tokens(model),
                 stream=True,
-                store=True
+                store=True,
+                timeout=httpx.Timeout(get_stream_timeouts(model)[0], connect=HTTP_CONNECT_TIMEOUT)
             )
-            requested_at = int(time.time() * 1000)
-            
+            yield ""  # Opened: _watch_stream starts its first-token watchdog now
+
             async for chunk in stream:
                 if chunk.choices[0].delta.content:
+                    timer.chunk()
                     yield chunk.choices[0].delta.content
 
             received_at = int(time.time() * 1000)
+            timings = timer.finish()
 
             # Log request to database after completion
             completion_obj = {
@@ -231,36 +523,36 @@ class API:
                 },
                 resp_payload=completion_obj,
                 status_code=200,
-                tags={"source": "openpipe"}
+                tags={"source": "openpipe", **timings}
             )
         except Exception as e:
-            error_message = str(e)
-            logging.error(f"[API] OpenPipe streaming error: {error_message}")
-            raise Exception(f"OpenPipe API error: {error_message}")
+            logging.error(f"[API] OpenPipe streaming error: {str(e)}")
+            raise classify_error(e, "openpipe", model) from e
+        finally:
+            # Close the HTTP response whether the stream finished, failed, or was cancelled mid-way
+            if stream is not None:
+                await stream.close()
 
-    @backoff.on_exception(
-        backoff.expo,
-        (aiohttp.ClientError, asyncio.TimeoutError),
-        max_tries=5,
-        max_time=60
-    )
-    async def call_openpipe(self, messages: List[Dict[str, Union[str, List[Dict[str, Any]]]]], model: str, temperature: float = None, stream: bool = False, max_tokens: int = None) -> Union[Dict, AsyncGenerator[str, None]]:
+    async def call_openpipe(self, messages: List[Dict[str, Union[str, List[Dict[str, Any]]]]], model: str, temperature: float = None, stream: bool = False, max_tokens: int = None, fallback_models: Optional[Sequence[Tuple[str, str]]] = None, cache: Optional[bool] = None) -> Union[Dict, AsyncGenerator[str, None]]:
         try:
-            logging.debug(f"[API] Making OpenPipe request to model: {model}")
-            logging.debug(f"[API] Request messages structure:")
-            for msg in messages:
-                logging.debug(f"[API] Message role: {msg.get('role')}")
-                logging.debug(f"[API] Message content: {msg.get('content')}")
+            # Log request details (the message summary and payload are only built if debug logging is on)
+            log.debug("OpenPipe request", model=model, messages=lambda: describe_messages(messages))
+            payload_log.debug("OpenPipe request payload", model=model, messages=lambda: messages)
 
             if stream:
-                return self._stream_openpipe_request(messages, model, temperature, max_tokens)
+                if fallback_models:
+                    return self._hedged_stream("openpipe", messages, model, temperature, max_tokens, fallback_models)
+                return self._watch_stream("openpipe", messages, model, temperature, max_tokens)
             else:
                 requested_at = int(time.time() * 1000)
-                response = await self.openpipe_client.chat.completions.create(
+                response, sent = await self._complete(
+                    "openpipe",
+                    cache,
+                    None,
                     model=model,
                     messages=messages,
                     temperature=temperature if temperature is not None else 0.7,
-                    max_tokens=max_tokens if max_tokens is not None else 1000,
+                    max_tokens=max_tokens if max_tokens is not None else max_output_tokens(model),
                     store=True
                 )
                 received_at = int(time.time() * 1000)
@@ -272,6 +564,10 @@ class API:
                         }
                     }]
                 }
+                if not sent:
+                    # Served from the cache or another caller's identical request: no provider latency or request to log
+                    return result
+                metrics.observe('total', received_at - requested_at, "openpipe", model)
 
                 # Log the interaction
                 await self.report(
@@ -291,37 +587,91 @@ class API:
                 return result
 
         except Exception as e:
-            error_message = str(e)
-            logging.error(f"[API] OpenPipe error: {error_message}")
-            raise Exception(f"OpenPipe API error: {error_message}")
+            error = classify_error(e, "openpipe", model)
+            logging.error(f"[API] OpenPipe error ({type(error).__name__}): {str(e)}")
+            raise error from e
 
     async def report(self, requested_at: int, received_at: int, req_payload: Dict, resp_payload: Dict, status_code: int, tags: Dict = None):
-        """Report interaction metrics"""
+        """Queue interaction metrics for the background reporter; never blocks the caller"""
         try:
-            if self.db_conn is None or self.db_cursor is None:
-                logging.error("[API] Database connection not available. Skipping logging.")
+            if self._report_queue is None:
+                self._report_queue = asyncio.Queue(maxsize=REPORT_QUEUE_SIZE)
+            if self._report_task is None or self._report_task.done():
+                self._report_task = asyncio.create_task(self._report_worker())
+
+            entry = (requested_at, received_at, req_payload, resp_payload, status_code, tags)
+            try:
+                self._report_queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # Saturated: either drop the new report, or admit a sample of them by evicting the oldest
+                if REPORT_OVERFLOW_POLICY == 'sample' and random.random() < REPORT_SAMPLE_RATE:
+                    self._report_queue.get_nowait()
+                    self._report_queue.task_done()
+                    self._report_queue.put_nowait(entry)
+                self.report_stats['dropped'] += 1
                 return
+            self.report_stats['queued'] += 1
 
-            # Add timestamp to tags
-            if tags is None:
-                tags = {}
-            tags_str = json.dumps(tags)
+        except Exception as e:
+            logging.error(f"[API] Failed to report interaction: {str(e)}")
 
-            # Prepare SQL statement
-            sql = "INSERT INTO logs (requested_at, received_at, request, response, status_code, tags) VALUES (?, ?, ?, ?, ?, ?)"
-            values = (requested_at, received_at, json.dumps(req_payload), json.dumps(resp_payload), status_code, tags_str)
+    @staticmethod
+    def _serialize_reports(batch):
+        """Build log rows for a batch of reports (runs in a worker thread)"""
+        rows = []
+        for requested_at, received_at, req_payload, resp_payload, status_code, tags in batch:
+            try:
+                rows.append((requested_at, received_at, json.dumps(req_payload), json.dumps(resp_payload), status_code, json.dumps(tags or {})))
+            except Exception as e:
+                logging.error(f"[API] Failed to serialize report: {str(e)}")
+        return rows
 
-            # Execute SQL statement
-            self.db_cursor.execute(sql, values)
-            self.db_conn.commit()
-            logging.debug(f"[API] Logged interaction with status code {status_code}")
+    def _record_report_write(self, future, count):
+        if future.cancelled():
+            self.report_stats['failed'] += count
+        elif future.exception() is not None:
+            self.report_stats['failed'] += count
+            logging.error(f"[API] Failed to write {count} interaction reports: {str(future.exception())}")
+        else:
+            self.report_stats['written'] += count
 
-        except Exception as e:
-            logging.error(f"[API] Failed to report interaction: {str(e)}")
+    async def _report_worker(self):
+        """Serialize queued reports off the loop and hand them to the database writer in batches"""
+        sql = "INSERT INTO logs (requested_at, received_at, request, response, status_code, tags) VALUES (?, ?, ?, ?, ?, ?)"
+        while True:
+            batch = [await self._report_queue.get()]
+            while len(batch) < REPORT_BATCH_SIZE and not self._report_queue.empty():
+                batch.append(self._report_queue.get_nowait())
+            try:
+                rows = await asyncio.to_thread(self._serialize_reports, batch)
+                if rows:
+                    # The batch is one atomic submission; count it once the writer has committed (or failed) it
+                    future = await db.write_many([(sql, row) for row in rows])
+                    future.add_done_callback(lambda done, count=len(rows): self._record_report_write(done, count))
+                    logging.debug(f"[API] Queued {len(rows)} interaction reports")
+            except Exception as e:
+                logging.error(f"[API] Failed to report interactions: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._report_queue.task_done()
+
+    async def prewarm(self):
+        """Open (or refresh) a pooled TLS connection to every provider so the next request skips the handshake"""
+        async def warm(base_url):
+            started = time.monotonic()
+            try:
+                # Any response will do; the point is the connection left in the pool
+                await self.http_client.head(base_url)
+                logging.debug(f"[API] Prewarmed {base_url} in {(time.monotonic() - started) * 1000:.0f}ms")
+            except Exception as e:
+                logging.warning(f"[API] Failed to prewarm {base_url}: {str(e)}")
+        await asyncio.gather(*(warm(base_url) for base_url in self.base_urls))
 
     async def close(self):
-        await self.session.close()
-        if self.db_conn:
-            self.db_conn.close()
+        """Drain pending reports and close the shared HTTP pool"""
+        if self._report_task is not None and not self._report_task.done():
+            await self._report_queue.join()
+            self._report_task.cancel()
+        await self.http_client.aclose()
 
 api = API()
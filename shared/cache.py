@@ -0,0 +1,137 @@
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB_MAX_ENTRIES, RESPONSE_CACHE_PRUNE_EVERY
+from shared.db import db
+from shared.metrics import metrics
+
+# Discord signs attachment URLs with expiring query parameters, so the same image gets a new URL every day
+DISCORD_CDN_HOSTS = ('cdn.discordapp.com', 'media.discordapp.net')
+
+# Request fields that change how a completion is logged, not what it says
+UNCACHED_FIELDS = ('store', 'metadata', 'stream')
+
+def _canonical_url(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.hostname in DISCORD_CDN_HOSTS:
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+    return url
+
+def _canonical_messages(messages: List[Dict]) -> List[Dict]:
+    canonical = []
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, list):
+            content = [
+                {**part, 'image_url': {**part['image_url'], 'url': _canonical_url(part['image_url']['url'])}}
+                if part.get('type') == 'image_url' else part
+                for part in content
+            ]
+        canonical.append({**message, 'content': content})
+    return canonical
+
+def cache_key(provider: str, **request: Any) -> str:
+    """SHA-256 of the canonical JSON form of a completion request (model, messages, temperature, max_tokens, ...)"""
+    fields = {name: value for name, value in request.items() if name not in UNCACHED_FIELDS}
+    fields['provider'] = provider
+    fields['messages'] = _canonical_messages(fields.get('messages', []))
+    canonical = json.dumps(fields, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier cache of completion responses: an in-memory LRU in front of the
+    response_cache table. Entries expire after their TTL; the memory tier is
+    capped at max_entries and the table is pruned to db_max_entries (soonest
+    to expire first) every prune_every writes. Table writes go through the
+    write-behind queue, so a set() never waits on sqlite.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 db_max_entries: int = RESPONSE_CACHE_DB_MAX_ENTRIES, prune_every: int = RESPONSE_CACHE_PRUNE_EVERY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_max_entries = db_max_entries
+        self.prune_every = prune_every
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._writes = 0
+        self.hits = {'memory': 0, 'sqlite': 0}
+        self.misses = 0
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str, model: str = "") -> Optional[str]:
+        """The cached value for key, or None on a miss"""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hit('memory', model)
+                return entry[1]
+            del self._entries[key]
+
+        try:
+            row = await db.fetchone("SELECT response, expires_at FROM response_cache WHERE key = ?", (key,))
+        except Exception as e:
+            logging.error(f"[Cache] Failed to read response cache: {str(e)}")
+            row = None
+        if row is not None and row[1] > now:
+            self._remember(key, row[0], row[1])
+            self._hit('sqlite', model)
+            return row[0]
+
+        self.misses += 1
+        metrics.increment('cache_miss', 'cache', model)
+        return None
+
+    def _hit(self, tier: str, model: str):
+        self.hits[tier] += 1
+        metrics.increment(f'cache_hit_{tier}', 'cache', model)
+
+    async def set(self, key: str, value: str, model: str = "", ttl: Optional[float] = None):
+        """Store a value in both tiers"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        self._remember(key, value, expires_at)
+        try:
+            await db.write(
+                "INSERT OR REPLACE INTO response_cache (key, model, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, value, now, expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                await self._prune(now)
+        except Exception as e:
+            logging.error(f"[Cache] Failed to store response: {str(e)}")
+
+    async def _prune(self, now: float):
+        """Drop expired rows, then the soonest-to-expire rows beyond db_max_entries"""
+        await db.write_many([
+            ("DELETE FROM response_cache WHERE expires_at <= ?", (now,)),
+            ("""DELETE FROM response_cache WHERE key IN (
+                    SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )""", (self.db_max_entries,)),
+        ])
+
+    def stats(self) -> Dict:
+        """Hit and miss counts plus the overall hit ratio"""
+        hits = sum(self.hits.values())
+        lookups = hits + self.misses
+        return {
+            'memory_hits': self.hits['memory'],
+            'sqlite_hits': self.hits['sqlite'],
+            'misses': self.misses,
+            'hit_ratio': hits / lookups if lookups else None,
+            'entries': len(self._entries),
+        }
+
+response_cache = ResponseCache()
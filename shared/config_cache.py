@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Callable, Dict, Optional
+
+class JsonConfigFile:
+    """
+    JSON config file held in memory with a prebuilt lookup index. The file is
+    stat'ed at most once per check_interval and reloaded only when its mtime
+    changes; writes made through save() update the cache directly.
+    """
+
+    def __init__(self, path: str, build_index: Callable[[Dict], Dict] = None, check_interval: float = 1.0):
+        self.path = path
+        self.build_index = build_index or (lambda data: data)
+        self.check_interval = check_interval
+        self.data: Dict = {}
+        self.index: Dict = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+
+        data = {}
+        if mtime is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logging.error(f"Error loading {self.path}: {str(e)}")
+                return
+        self._load(data, mtime)
+        logging.debug(f"Reloaded {self.path}")
+
+    def _load(self, data: Dict, mtime: Optional[float]):
+        self.data = data
+        self.index = self.build_index(data)
+        self._mtime = mtime
+
+    def get(self, key, default=None) -> Any:
+        """O(1) lookup in the index, reloading the file first if it changed"""
+        self._refresh()
+        return self.index.get(key, default)
+
+    def snapshot(self) -> Dict:
+        """Return a copy of the current raw data for read-modify-write"""
+        self._refresh()
+        return json.loads(json.dumps(self.data))
+
+    def save(self, data: Dict):
+        """Write the file atomically and update the cache without a reload"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self._load(data, os.stat(self.path).st_mtime)
+
+def _index_dynamic_prompts(data: Dict) -> Dict:
+    """Index prompts by (guild_id, channel_id); channel-only entries use guild_id None"""
+    index = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            for channel_id, prompt in value.items():
+                index[(key, channel_id)] = prompt
+        else:
+            index[(None, key)] = value
+    return index
+
+dynamic_prompts = JsonConfigFile("dynamic_prompts.json", _index_dynamic_prompts)
+temperatures = JsonConfigFile("temperatures.json")
+
+def get_dynamic_prompt(guild_id: Optional[str], channel_id: str) -> Optional[str]:
+    """Get the custom prompt for a channel, preferring the guild-scoped entry"""
+    prompt = dynamic_prompts.get((guild_id, channel_id)) if guild_id else None
+    return prompt if prompt is not None else dynamic_prompts.get((None, channel_id))
+
+def set_dynamic_prompt(guild_id: Optional[str], channel_id: str, prompt: str):
+    """Set a custom prompt for a channel and persist it"""
+    data = dynamic_prompts.snapshot()
+    if guild_id:
+        data.setdefault(guild_id, {})[channel_id] = prompt
+    else:
+        data[channel_id] = prompt
+    dynamic_prompts.save(data)
+
+def reset_dynamic_prompt(guild_id: Optional[str], channel_id: str):
+    """Remove a channel's custom prompt and persist the change"""
+    data = dynamic_prompts.snapshot()
+    if guild_id and guild_id in data:
+        if channel_id in data[guild_id]:
+            del data[guild_id][channel_id]
+            if not data[guild_id]:  # Remove guild if empty
+                del data[guild_id]
+    elif channel_id in data:
+        del data[channel_id]
+    dynamic_prompts.save(data)
+
+def get_temperature(agent_name: str) -> Optional[float]:
+    """Get the configured temperature for an agent (None lets the API use its default)"""
+    return temperatures.get(agent_name)
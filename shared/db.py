@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+import aiosqlite
+from config import DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_MS, DB_WRITE_QUEUE_SIZE
+from shared.migrations import migrate
+
+DB_PATH = 'databases/interaction_logs.db'
+
+# Applied to every pooled connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+Statement = Tuple[str, Sequence[Any]]
+
+class BatchWriter:
+    """
+    Write-behind queue that group-commits inserts on a background task.
+    Each submission is a list of statements executed in order on the same
+    connection; a batch is committed every batch_size submissions or
+    batch_ms milliseconds, whichever comes first. The queue is bounded, so
+    submit() applies backpressure when the writer falls behind.
+    """
+
+    def __init__(self, database: "Database", batch_size: int = DB_WRITE_BATCH_SIZE,
+                 batch_ms: int = DB_WRITE_BATCH_MS, queue_size: int = DB_WRITE_QUEUE_SIZE):
+        self.database = database
+        self.batch_size = batch_size
+        self.batch_delay = batch_ms / 1000
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, statements: List[Statement]) -> asyncio.Future:
+        """Queue statements for the next batch; the future resolves once they are committed"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((statements, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._commit_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch):
+        results = []
+        try:
+            async with self.database.connection() as conn:
+                try:
+                    if not conn.in_transaction:
+                        await conn.execute("BEGIN")
+                    for statements, future in batch:
+                        # Each submission is atomic: a failure rolls back all of its statements, not just the failing one
+                        await conn.execute("SAVEPOINT submission")
+                        try:
+                            cursor = None
+                            for sql, params in statements:
+                                cursor = await conn.execute(sql, params)
+                            await conn.execute("RELEASE submission")
+                            results.append((future, cursor.lastrowid if cursor else None, None))
+                        except Exception as e:
+                            # The rest of the batch still commits
+                            await conn.execute("ROLLBACK TO submission")
+                            await conn.execute("RELEASE submission")
+                            results.append((future, None, e))
+                    await conn.commit()
+                except BaseException:
+                    # Don't hand the pooled connection back with an open or failed transaction
+                    if conn.in_transaction:
+                        try:
+                            await conn.rollback()
+                        except Exception as e:
+                            logging.error(f"[DB] Failed to roll back a failed batch: {str(e)}")
+                    raise
+        except Exception as e:
+            logging.error(f"[DB] Failed to commit batch of {len(batch)} writes: {str(e)}")
+            results = [(future, None, e) for _, future in batch]
+
+        failed = sum(1 for _, _, error in results if error is not None)
+        if failed:
+            logging.warning(f"[DB] Committed {len(batch) - failed} writes, {failed} failed and were rolled back")
+        else:
+            logging.debug(f"[DB] Committed batch of {len(batch)} writes")
+
+        for future, lastrowid, error in results:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(lastrowid)
+
+    async def flush(self):
+        """Wait until everything queued so far has been committed"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def close(self):
+        """Flush outstanding writes and stop the background task"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+class Database:
+    """
+    Small pool of long-lived aiosqlite connections shared by every cog.
+    aiosqlite runs each connection on its own thread, so queries and commits
+    never block the event loop. The pool is opened lazily on first use.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = 4):
+        self.path = path
+        self.pool_size = pool_size
+        self._pool: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+        self._init_lock: Optional[asyncio.Lock] = None
+        self.writer = BatchWriter(self)
+
+    def _setup(self):
+        """Run pending schema migrations once with a short-lived synchronous connection"""
+        conn = sqlite3.connect(self.path)
+        try:
+            migrate(conn)
+        finally:
+            conn.close()
+
+    async def _ensure_pool(self):
+        if self._pool is not None:
+            return
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self._pool is not None:
+                return
+            await asyncio.to_thread(self._setup)
+            pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                conn = await aiosqlite.connect(self.path)
+                for pragma in CONNECTION_PRAGMAS:
+                    await conn.execute(pragma)
+                self._connections.append(conn)
+                pool.put_nowait(conn)
+            self._pool = pool
+            logging.info(f"[DB] Opened {self.pool_size} pooled connections to {self.path}")
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a pooled connection for a multi-statement unit of work"""
+        await self._ensure_pool()
+        conn = await self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put_nowait(conn)
+
+    async def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Execute a single write and commit it, returning the last row ID"""
+        async with self.connection() as conn:
+            cursor = await conn.execute(sql, params)
+            await conn.commit()
+            return cursor.lastrowid
+
+    async def executemany(self, sql: str, rows: Iterable[Sequence[Any]]):
+        """Execute a write for every row in one transaction"""
+        async with self.connection() as conn:
+            await conn.executemany(sql, rows)
+            await conn.commit()
+
+    async def write(self, sql: str, params: Sequence[Any] = ()) -> asyncio.Future:
+        """Queue a write on the write-behind queue; await the returned future for read-your-writes"""
+        return await self.writer.submit([(sql, params)])
+
+    async def write_many(self, statements: List[Statement]) -> asyncio.Future:
+        """Queue several statements that must run back to back on the same connection"""
+        return await self.writer.submit(statements)
+
+    async def fetchone(self, sql: str, params: Sequence[Any] = ()):
+        """Run a query and return its first row"""
+        async with self.connection() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: Sequence[Any] = ()):
+        """Run a query and return all rows"""
+        async with self.connection() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+
+    async def close(self):
+        """Flush queued writes and close every pooled connection"""
+        await self.writer.close()
+        for conn in self._connections:
+            try:
+                await conn.close()
+            except Exception as e:
+                logging.error(f"[DB] Failed to close connection: {str(e)}")
+        self._connections = []
+        self._pool = None
+
+db = Database()
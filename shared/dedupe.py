@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import List
+
+class ProcessedMessageStore:
+    """
+    Time-windowed LRU of processed Discord message IDs backed by an
+    append-only journal. Marking a message only touches memory; new IDs are
+    appended to the journal by flush(), which also compacts it once it holds
+    mostly expired entries.
+    """
+
+    def __init__(self, path: str, window_seconds: int = 3600, max_entries: int = 10000):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, float]" = OrderedDict()
+        self._pending: List[str] = []
+        self._journal_lines = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, message_id) -> bool:
+        seen_at = self._entries.get(int(message_id))
+        if seen_at is None:
+            return False
+        if time.time() - seen_at > self.window_seconds:
+            del self._entries[int(message_id)]
+            return False
+        return True
+
+    def add(self, message_id):
+        """Mark a message as processed"""
+        message_id = int(message_id)
+        now = time.time()
+        self._entries[message_id] = now
+        self._entries.move_to_end(message_id)
+        self._pending.append(f"{message_id}\t{now}\n")
+        self._evict(now)
+
+    def _evict(self, now: float):
+        """Drop entries that fell out of the window or exceed the size bound"""
+        cutoff = now - self.window_seconds
+        while self._entries:
+            oldest_id, seen_at = next(iter(self._entries.items()))
+            if seen_at >= cutoff and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def load(self):
+        """Load the still-live entries from the journal (or a legacy JSON dump)"""
+        now = time.time()
+        cutoff = now - self.window_seconds
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    self._journal_lines += 1
+                    try:
+                        message_id, seen_at = line.split('\t')
+                        if float(seen_at) >= cutoff:
+                            self._entries[int(message_id)] = float(seen_at)
+                    except ValueError:
+                        continue
+        else:
+            legacy_file = os.path.splitext(self.path)[0] + '.json'
+            if os.path.exists(legacy_file):
+                with open(legacy_file, 'r') as f:
+                    for message_id in json.load(f):
+                        self.add(message_id)
+        self._evict(now)
+
+    def flush(self):
+        """Append pending IDs to the journal, compacting it when it has grown stale"""
+        pending, self._pending = self._pending, []
+        self._write(pending, self._snapshot_if_stale(len(pending)))
+
+    async def flush_async(self):
+        """Flush without blocking the event loop"""
+        pending, self._pending = self._pending, []
+        snapshot = self._snapshot_if_stale(len(pending))
+        if pending or snapshot is not None:
+            await asyncio.to_thread(self._write, pending, snapshot)
+
+    def _snapshot_if_stale(self, pending_count: int):
+        """Return the live entries if the journal should be rewritten, else None"""
+        if self._journal_lines + pending_count > 2 * len(self._entries) + 1000:
+            return [f"{message_id}\t{seen_at}\n" for message_id, seen_at in self._entries.items()]
+        return None
+
+    def _write(self, pending: List[str], snapshot):
+        try:
+            if snapshot is not None:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.writelines(snapshot)
+                os.replace(tmp_path, self.path)
+                self._journal_lines = len(snapshot)
+                logging.debug(f"Compacted processed message journal to {len(snapshot)} entries")
+            elif pending:
+                with open(self.path, 'a') as f:
+                    f.writelines(pending)
+                self._journal_lines += len(pending)
+        except Exception as e:
+            logging.error(f"Error saving processed messages: {str(e)}")
@@ -0,0 +1,123 @@
+import time
+import asyncio
+import logging
+import weakref
+import discord
+from typing import Optional
+from config import EDIT_MIN_INTERVAL, EDIT_MAX_INTERVAL, EDIT_SLOW_SECONDS
+from shared.metrics import metrics
+
+class ChannelEditBudget:
+    """
+    Edit pacing shared by every streamed reply in a channel. Edits are handed
+    out one at a time in FIFO order, at most one per interval. discord.py
+    handles 429s internally and doesn't expose the rate-limit headers, so the
+    interval adapts to what it can observe instead: an edit that was slow
+    (discord.py sleeping on a bucket) or failed with a 429 doubles it, and
+    fast edits decay it back towards the minimum.
+    """
+
+    def __init__(self, min_interval: float = EDIT_MIN_INTERVAL, max_interval: float = EDIT_MAX_INTERVAL):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for this channel's next edit slot"""
+        async with self._lock:
+            delay = self._next_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_at = time.monotonic() + self.interval
+
+    def record(self, latency: float, rate_limited: bool = False):
+        """Adapt the interval to how the last edit went"""
+        if rate_limited or latency > EDIT_SLOW_SECONDS:
+            self.interval = min(self.interval * 2, self.max_interval)
+        else:
+            self.interval = max(self.min_interval, self.interval * 0.9)
+
+# Budgets live as long as some reply in the channel is still streaming
+_budgets: "weakref.WeakValueDictionary[int, ChannelEditBudget]" = weakref.WeakValueDictionary()
+
+def get_edit_budget(channel_id: int) -> ChannelEditBudget:
+    """Get the shared edit budget for a channel"""
+    budget = _budgets.get(channel_id)
+    if budget is None:
+        budget = ChannelEditBudget()
+        _budgets[channel_id] = budget
+    return budget
+
+class EditScheduler:
+    """
+    Coalesces edits to one streamed message. update() only records the
+    latest content; a background task pushes it whenever the channel budget
+    allows, so superseded intermediate states are never sent. finish()
+    sends the final content (plus any extra edit kwargs such as a view).
+    """
+
+    def __init__(self, message: discord.Message):
+        self.message = message
+        self.budget = get_edit_budget(message.channel.id)
+        self._latest: Optional[str] = None
+        self._sent: Optional[str] = message.content
+        self._dirty = asyncio.Event()
+        self._closed = False
+        self._editing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, content: str):
+        """Record the newest content to show"""
+        self._latest = content
+        self._dirty.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            await self._dirty.wait()
+            await self.budget.acquire()
+            self._dirty.clear()
+            self._editing = True
+            try:
+                await self._edit(content=self._latest)
+            finally:
+                self._editing = False
+
+    async def _edit(self, **kwargs):
+        content = kwargs.get('content')
+        if content is not None and content == self._sent and len(kwargs) == 1:
+            return
+        started = time.monotonic()
+        try:
+            await self.message.edit(**kwargs)
+            if content is not None:
+                self._sent = content
+            self.budget.record(time.monotonic() - started)
+            metrics.observe_since('discord_edit', started, 'discord')
+        except discord.HTTPException as e:
+            self.budget.record(time.monotonic() - started, rate_limited=e.status == 429)
+            logging.warning(f"[Edits] Failed to edit message {self.message.id}: {str(e)}")
+        except Exception as e:
+            logging.error(f"[Edits] Error editing message {self.message.id}: {str(e)}")
+
+    async def finish(self, content: Optional[str] = None, **kwargs):
+        """Stop coalescing and make the final edit"""
+        self._closed = True
+        if self._task is not None:
+            # Let an in-flight edit land, but don't wait out a pending slot just to throw it away
+            if not self._editing:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if content is None:
+            content = self._latest
+        if content is not None:
+            kwargs['content'] = content
+        if kwargs:
+            await self.budget.acquire()
+            await self._edit(**kwargs)
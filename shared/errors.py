@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+import httpx
+import openai
+from config import ERROR_MESSAGES, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS
+
+class ProviderError(Exception):
+    """
+    Base class for LLM provider failures. retryable marks errors worth
+    retrying with backoff; trips_breaker marks errors that suggest the
+    provider or model itself is unhealthy.
+    """
+    retryable = False
+    trips_breaker = False
+    message_key = 'unknown_error'
+
+    def __init__(self, message: str, provider: str = None, model: str = None, status: int = None):
+        super().__init__(message)
+        self.provider = provider
+        self.model = model
+        self.status = status
+
+class RateLimited(ProviderError):
+    """429 from the provider"""
+    retryable = True
+    message_key = 'rate_limit'
+
+class ProviderUnavailable(ProviderError):
+    """5xx from the provider"""
+    retryable = True
+    trips_breaker = True
+    message_key = 'provider_unavailable'
+
+class ProviderConnectionError(ProviderError):
+    """Connection reset, refused, or timed out"""
+    retryable = True
+    trips_breaker = True
+    message_key = 'network_error'
+
+class QuotaExceeded(ProviderError):
+    """Out of credits"""
+    message_key = 'credits_depleted'
+
+class AuthenticationFailed(ProviderError):
+    """Invalid or unauthorized API key"""
+    message_key = 'invalid_api_key'
+
+class BadRequest(ProviderError):
+    """The provider rejected the request itself (4xx)"""
+
+class StreamStalled(ProviderError):
+    """A streamed completion produced no chunk within its watchdog timeout"""
+    trips_breaker = True
+    message_key = 'provider_unavailable'
+
+class CircuitOpen(ProviderError):
+    """The model's circuit breaker is open, so the request failed fast"""
+    message_key = 'provider_unavailable'
+
+class LimiterTimeout(ProviderError):
+    """A request waited longer than the limiter allows for admission"""
+    message_key = 'rate_limit'
+
+def classify_error(error: BaseException, provider: str = None, model: str = None) -> ProviderError:
+    """Map an openai/httpx exception onto the taxonomy (ProviderErrors pass through unchanged)"""
+    if isinstance(error, ProviderError):
+        return error
+    message = str(error)
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status == 402 or getattr(error, 'code', None) == 'insufficient_quota' or 'insufficient_quota' in message:
+            return QuotaExceeded(message, provider, model, status)
+        if status in (401, 403):
+            return AuthenticationFailed(message, provider, model, status)
+        if status == 429:
+            return RateLimited(message, provider, model, status)
+        if status == 408 or status >= 500:
+            return ProviderUnavailable(message, provider, model, status)
+        return BadRequest(message, provider, model, status)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return ProviderConnectionError(message or type(error).__name__, provider, model)
+    return ProviderError(message, provider, model)
+
+def user_error_message(error: BaseException) -> str:
+    """The message to show in Discord for a failed response"""
+    key = error.message_key if isinstance(error, ProviderError) else 'unknown_error'
+    return ERROR_MESSAGES.get(key, ERROR_MESSAGES['unknown_error'])
+
+class CircuitBreaker:
+    """
+    Per-model breaker: after failure_threshold consecutive provider-side
+    failures it opens and requests fail fast with CircuitOpen. After
+    reset_seconds one probe request is let through (half-open); its
+    outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def check(self, provider: str = None, model: str = None):
+        """Raise CircuitOpen unless a request may go through"""
+        state = self.state
+        if state == 'closed':
+            return
+        if state == 'half-open' and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpen(f"{self.name} is failing, skipping it for now", provider, model)
+
+    def abandon(self):
+        """A probe was cancelled before it could tell us anything"""
+        self._probing = False
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"[Circuit] {self.name} recovered, closing breaker")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self.state == 'closed' or self._probing:
+                logging.warning(f"[Circuit] {self.name} failed {self.failures} times, opening breaker for {self.reset_seconds:.0f}s")
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+class CircuitBreakers:
+    """Breakers keyed by (provider, model)"""
+
+    def __init__(self):
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get((provider, model))
+        if breaker is None:
+            breaker = self._breakers[(provider, model)] = CircuitBreaker(f"{provider}/{model}")
+        return breaker
+
+    def open_breakers(self):
+        return [breaker for breaker in self._breakers.values() if breaker.state != 'closed']
+
+circuit_breakers = CircuitBreakers()
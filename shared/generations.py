@@ -0,0 +1,96 @@
+import time
+import asyncio
+import logging
+from typing import AsyncGenerator, Dict, List
+
+class Generation:
+    """One in-flight response: the task producing it and the Discord messages it belongs to"""
+
+    def __init__(self, request_id: int, channel_id: int, agent_name: str, task: asyncio.Task, max_tokens: int):
+        self.request_id = request_id
+        self.channel_id = channel_id
+        self.agent_name = agent_name
+        self.task = task
+        self.max_tokens = max_tokens
+        self.reply_ids: List[int] = []
+        self.started_at = time.monotonic()
+        self.chunks = 0
+
+    async def wrap(self, stream: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+        """Count streamed chunks (roughly one token each) and close the upstream stream when done"""
+        try:
+            async for chunk in stream:
+                self.chunks += 1
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def estimate_savings(self):
+        """Estimate the (tokens, seconds) a cancellation saves, assuming the reply would have run to max_tokens"""
+        tokens = max(self.max_tokens - self.chunks, 0)
+        elapsed = time.monotonic() - self.started_at
+        seconds = tokens * elapsed / self.chunks if self.chunks else 0.0
+        return tokens, seconds
+
+class GenerationRegistry:
+    """
+    Tracks in-flight generations by the Discord message that triggered them
+    and by every reply message they sent, so deleting either message, a
+    reroll, or an admin can cancel the task. Cancellation propagates into
+    the API stream, which closes its HTTP response on the way out.
+    """
+
+    def __init__(self):
+        self._by_message: Dict[int, List[Generation]] = {}
+        self.stats = {'cancelled': 0, 'tokens_saved': 0, 'seconds_saved': 0.0}
+
+    def _track(self, message_id: int, generation: Generation):
+        self._by_message.setdefault(message_id, []).append(generation)
+
+    def start(self, request_id: int, channel_id: int, agent_name: str, max_tokens: int) -> Generation:
+        """Register the current task as agent_name's reply to request_id, superseding its previous one"""
+        for previous in list(self._by_message.get(int(request_id), [])):
+            if previous.agent_name == agent_name and previous.request_id == int(request_id):
+                self._cancel(previous, "superseded")
+        generation = Generation(int(request_id), int(channel_id), agent_name, asyncio.current_task(), max_tokens)
+        self._track(generation.request_id, generation)
+        return generation
+
+    def add_reply(self, generation: Generation, reply_id: int):
+        """Track a message the generation sent so deleting it cancels the generation"""
+        generation.reply_ids.append(int(reply_id))
+        self._track(int(reply_id), generation)
+
+    def finish(self, generation: Generation):
+        """Forget a generation once it has completed or been cancelled"""
+        for message_id in [generation.request_id] + generation.reply_ids:
+            tracked = self._by_message.get(message_id)
+            if tracked and generation in tracked:
+                tracked.remove(generation)
+                if not tracked:
+                    del self._by_message[message_id]
+
+    def _cancel(self, generation: Generation, reason: str) -> bool:
+        self.finish(generation)
+        if generation.task is None or generation.task.done() or generation.task is asyncio.current_task():
+            return False
+
+        generation.task.cancel()
+        tokens, seconds = generation.estimate_savings()
+        self.stats['cancelled'] += 1
+        self.stats['tokens_saved'] += tokens
+        self.stats['seconds_saved'] += seconds
+        logging.info(f"[Generations] Cancelled {generation.agent_name} reply to {generation.request_id} ({reason}), saved ~{tokens} tokens and ~{seconds:.1f}s")
+        return True
+
+    def cancel(self, message_id: int, reason: str = "cancelled") -> List[Generation]:
+        """Cancel every generation answering, or replying in, the given message"""
+        tracked = list(self._by_message.get(int(message_id), []))
+        return [generation for generation in tracked if self._cancel(generation, reason)]
+
+    def cancel_channel(self, channel_id: int, reason: str = "cancelled") -> List[Generation]:
+        """Cancel every generation running in a channel"""
+        running = {generation for tracked in self._by_message.values() for generation in tracked if generation.channel_id == int(channel_id)}
+        return [generation for generation in running if self._cancel(generation, reason)]
+
+generations = GenerationRegistry()
@@ -0,0 +1,196 @@
+import re
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Mapping, Optional, Tuple
+from config import PROVIDER_LIMITS, MODEL_LIMITS, DEFAULT_MODEL_LIMITS, FREE_MODEL_LIMITS, LIMITER_MAX_WAIT
+from shared.metrics import metrics
+from shared.errors import LimiterTimeout
+
+class TokenBucket:
+    """
+    Requests-per-minute token bucket whose rate adapts to the provider:
+    a 429 halves the rate and blocks until the advertised reset, rate-limit
+    headers cap the tokens to what the provider says is left, and each
+    success creeps the rate back up towards the configured maximum.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.max_rate = requests_per_minute / 60
+        self.rate = self.max_rate
+        self.capacity = max(1.0, requests_per_minute / 6)  # Allow bursts of ~10 seconds' worth
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Take a token, waiting (in FIFO order) until one is available"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.01))
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        self.rate = max(self.max_rate / 10, self.rate / 2)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + (retry_after or 1 / self.rate))
+
+    def on_headers(self, remaining: Optional[float], reset_after: Optional[float]):
+        if remaining is None:
+            return
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+        if remaining < 1 and reset_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_after)
+
+class Limiter:
+    """Concurrency semaphore plus token bucket for one provider or model"""
+
+    def __init__(self, name: str, concurrency: int, requests_per_minute: float):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_minute)
+        self.waiting = 0
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse a reset header: seconds, epoch seconds/milliseconds, or durations like '1m30s' / '250ms'"""
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+        if not parts:
+            return None
+        scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(amount) * scale[unit] for amount, unit in parts)
+    if number > 1e12:  # Epoch milliseconds
+        return max(number / 1000 - time.time(), 0.0)
+    if number > 1e9:  # Epoch seconds
+        return max(number - time.time(), 0.0)
+    return number
+
+def parse_rate_limit_headers(headers: Mapping[str, str]) -> Tuple[Optional[float], Optional[float]]:
+    """Extract (requests remaining, seconds until reset) from OpenRouter/OpenAI style headers"""
+    remaining = headers.get('x-ratelimit-remaining') or headers.get('x-ratelimit-remaining-requests')
+    reset = headers.get('retry-after') or headers.get('x-ratelimit-reset') or headers.get('x-ratelimit-reset-requests')
+    try:
+        remaining = float(remaining) if remaining is not None else None
+    except ValueError:
+        remaining = None
+    return remaining, _parse_duration(reset) if reset else None
+
+def is_free_model(model: str) -> bool:
+    return model.endswith(':free')
+
+class RateLimiter:
+    """
+    Admission control for LLM requests: a request holds a concurrency slot
+    from both its provider's and its model's limiter for its whole duration,
+    and every attempt to send it (including retries) takes a token from both
+    buckets, so retries wait out a 429's Retry-After like everything else.
+    Waiting requests queue for at most max_wait seconds before failing with
+    LimiterTimeout. Free models get stricter defaults, and their rate-limit
+    feedback only throttles the model itself rather than the whole provider.
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, Limiter] = {}
+        self._models: Dict[Tuple[str, str], Limiter] = {}
+
+    def _limiters(self, provider: str, model: str) -> Tuple[Limiter, Limiter]:
+        provider_limiter = self._providers.get(provider)
+        if provider_limiter is None:
+            concurrency, rpm = PROVIDER_LIMITS.get(provider, DEFAULT_MODEL_LIMITS)
+            provider_limiter = self._providers[provider] = Limiter(provider, concurrency, rpm)
+        model_limiter = self._models.get((provider, model))
+        if model_limiter is None:
+            concurrency, rpm = MODEL_LIMITS.get(model, FREE_MODEL_LIMITS if is_free_model(model) else DEFAULT_MODEL_LIMITS)
+            model_limiter = self._models[(provider, model)] = Limiter(f"{provider}/{model}", concurrency, rpm)
+        return provider_limiter, model_limiter
+
+    def _feedback_bucket(self, provider: str, model: str) -> TokenBucket:
+        provider_limiter, model_limiter = self._limiters(provider, model)
+        return model_limiter.bucket if is_free_model(model) else provider_limiter.bucket
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, max_wait: float = LIMITER_MAX_WAIT):
+        """Hold a concurrency slot for the duration of a request (or stream); attempts then call acquire()"""
+        limiters = self._limiters(provider, model)
+        started = time.monotonic()
+        for limiter in limiters:
+            limiter.waiting += 1
+        metrics.observe('limiter_depth', limiters[1].waiting, provider, model)
+
+        acquired = []
+        try:
+            async def admit():
+                # Model first, so requests queued behind a busy model don't hold provider slots
+                for limiter in reversed(limiters):
+                    await limiter.semaphore.acquire()
+                    acquired.append(limiter)
+            await asyncio.wait_for(admit(), max_wait)
+        except asyncio.TimeoutError:
+            for limiter in acquired:
+                limiter.semaphore.release()
+            metrics.increment('limiter_timeout', provider, model)
+            logging.warning(f"[Limits] {provider}/{model} request waited over {max_wait:.0f}s for admission")
+            raise LimiterTimeout(f"{model} is busy, please try again shortly", provider, model)
+        except BaseException:
+            for limiter in acquired:
+                limiter.semaphore.release()
+            raise
+        finally:
+            for limiter in limiters:
+                limiter.waiting -= 1
+            metrics.observe_since('limiter_wait', started, provider, model)
+
+        try:
+            yield
+        finally:
+            for limiter in acquired:
+                limiter.semaphore.release()
+
+    async def acquire(self, provider: str, model: str, max_wait: float = LIMITER_MAX_WAIT):
+        """Take a token from the model's and provider's buckets before sending an attempt"""
+        started = time.monotonic()
+        try:
+            for limiter in reversed(self._limiters(provider, model)):
+                await asyncio.wait_for(limiter.bucket.acquire(), max(max_wait - (time.monotonic() - started), 0.01))
+        except asyncio.TimeoutError:
+            metrics.increment('limiter_timeout', provider, model)
+            logging.warning(f"[Limits] {provider}/{model} request waited over {max_wait:.0f}s for a rate limit token")
+            raise LimiterTimeout(f"{model} is busy, please try again shortly", provider, model)
+        finally:
+            metrics.observe_since('bucket_wait', started, provider, model)
+
+    def record_success(self, provider: str, model: str, headers: Mapping[str, str]):
+        """Let a successful response's rate-limit headers tune the bucket"""
+        bucket = self._feedback_bucket(provider, model)
+        bucket.on_success()
+        bucket.on_headers(*parse_rate_limit_headers(headers))
+
+    def record_rate_limited(self, provider: str, model: str, headers: Optional[Mapping[str, str]] = None):
+        """Back off after a 429"""
+        _, reset_after = parse_rate_limit_headers(headers or {})
+        self._feedback_bucket(provider, model).on_rate_limited(reset_after)
+        metrics.increment('rate_limited', provider, model)
+        logging.warning(f"[Limits] {provider}/{model} was rate limited, backing off {reset_after or 0:.1f}s")
+
+    def depth(self) -> Dict[str, int]:
+        """Requests currently waiting for admission, per model"""
+        return {limiter.name: limiter.waiting for limiter in self._models.values() if limiter.waiting}
+
+limits = RateLimiter()
@@ -0,0 +1,76 @@
+import random
+import logging
+from typing import Any, Dict, List
+from config import LOG_MAX_FIELD_CHARS, LOG_SAMPLE_RATES
+from shared.tokens import estimate_messages_tokens
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    """Render a log field, cutting it to limit characters"""
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…(+{len(text) - limit} chars)"
+
+def describe_messages(messages: List[Dict]) -> str:
+    """One-line shape of an API message list: count, roles, images and estimated tokens"""
+    roles: Dict[str, int] = {}
+    images = 0
+    for message in messages:
+        roles[message.get('role')] = roles.get(message.get('role'), 0) + 1
+        content = message.get('content')
+        if isinstance(content, list):
+            images += sum(1 for part in content if part.get('type') == 'image_url')
+    role_counts = ", ".join(f"{count} {role}" for role, count in roles.items())
+    return f"{len(messages)} messages ({role_counts}), {images} images, ~{estimate_messages_tokens(messages)} tokens"
+
+class StructuredLogger:
+    """
+    Logs "[Category] message key=value ..." lines through the root logger.
+    Nothing is formatted unless the level is enabled: fields are passed as
+    keyword arguments, callables among them are only called once the line
+    is actually emitted, and every value is truncated to LOG_MAX_FIELD_CHARS.
+    Categories listed in LOG_SAMPLE_RATES only log that fraction of their
+    debug and info lines; warnings and errors are never sampled.
+    """
+
+    def __init__(self, category: str):
+        self.category = category
+        self.sample_rate = LOG_SAMPLE_RATES.get(category, 1.0)
+        self._logger = logging.getLogger()
+
+    def enabled(self, level: int = logging.DEBUG) -> bool:
+        """Guard for callers that need to do extra work before logging"""
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, message: str, fields: Dict[str, Any]):
+        if not self._logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        parts = [f"[{self.category}] {message}"]
+        for name, value in fields.items():
+            if callable(value):
+                value = value()
+            parts.append(f"{name}={truncate(value)}")
+        self._logger.log(level, " ".join(parts))
+
+    def debug(self, message: str, **fields: Any):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields: Any):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields: Any):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, **fields: Any):
+        self._log(logging.ERROR, message, fields)
+
+_loggers: Dict[str, StructuredLogger] = {}
+
+def get_logger(category: str) -> StructuredLogger:
+    """The shared logger for a category such as "API" or an agent's name"""
+    logger = _loggers.get(category)
+    if logger is None:
+        logger = _loggers[category] = StructuredLogger(category)
+    return logger
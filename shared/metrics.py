@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds: milliseconds for latencies, tokens/sec for throughput, requests for queue depth
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+THROUGHPUT_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 640)
+DEPTH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Metrics that are not latencies in milliseconds
+METRIC_BUCKETS = {
+    'tokens_per_sec': THROUGHPUT_BUCKETS,
+    'limiter_depth': DEPTH_BUCKETS,
+}
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is O(log buckets) and memory never grows"""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last bucket catches everything above the top bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Estimate the p-th percentile (0-100) by interpolating inside its bucket"""
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': dict(zip([str(b) for b in self.bounds] + ['inf'], self.counts)),
+        }
+
+class Metrics:
+    """
+    Histograms keyed by (metric, provider, model). Latencies are recorded in
+    milliseconds; tokens_per_sec in tokens per second.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str, str], int] = {}
+        self.started_at = time.time()
+
+    def observe(self, metric: str, value: float, provider: str = "", model: str = ""):
+        """Record one observation"""
+        key = (metric, provider or "", model or "")
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = Histogram(METRIC_BUCKETS.get(metric, LATENCY_BUCKETS_MS))
+            self._histograms[key] = histogram
+        histogram.observe(value)
+
+    def observe_since(self, metric: str, started: float, provider: str = "", model: str = ""):
+        """Record the milliseconds elapsed since a time.monotonic() timestamp"""
+        self.observe(metric, (time.monotonic() - started) * 1000, provider, model)
+
+    def increment(self, counter: str, provider: str = "", model: str = "", amount: int = 1):
+        """Count an event such as a stall or failover"""
+        key = (counter, provider or "", model or "")
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter_rows(self, match: str = None) -> List[Tuple[str, str, str, int]]:
+        """Every counter sorted by name, provider and model, optionally filtered by a substring"""
+        return [
+            (counter, provider, model, value)
+            for (counter, provider, model), value in sorted(self._counters.items())
+            if not match or match.lower() in f"{counter} {provider} {model}".lower()
+        ]
+
+    def get(self, metric: str, provider: str = "", model: str = "") -> Optional[Histogram]:
+        return self._histograms.get((metric, provider or "", model or ""))
+
+    def rows(self, match: str = None) -> List[Tuple[str, str, str, Histogram]]:
+        """Every histogram sorted by metric, provider and model, optionally filtered by a substring"""
+        rows = []
+        for (metric, provider, model), histogram in sorted(self._histograms.items()):
+            if match and match.lower() not in f"{metric} {provider} {model}".lower():
+                continue
+            rows.append((metric, provider, model, histogram))
+        return rows
+
+    def snapshot(self) -> Dict:
+        return {
+            'started_at': self.started_at,
+            'dumped_at': time.time(),
+            'metrics': [
+                {'metric': metric, 'provider': provider, 'model': model, **histogram.snapshot()}
+                for metric, provider, model, histogram in self.rows()
+            ],
+            'counters': [
+                {'counter': counter, 'provider': provider, 'model': model, 'value': value}
+                for counter, provider, model, value in self.counter_rows()
+            ],
+        }
+
+    def dump(self, path: str):
+        """Write a JSON snapshot atomically for scraping"""
+        self._write(path, self.snapshot())
+
+    async def dump_async(self, path: str):
+        """Snapshot on the event loop, write the file in a worker thread"""
+        await asyncio.to_thread(self._write, path, self.snapshot())
+
+    @staticmethod
+    def _write(path: str, data: Dict):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+class StreamTimer:
+    """Times one streamed completion: time to first token, gaps between chunks, throughput and total"""
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.started = time.monotonic()
+        self.first_chunk_at: Optional[float] = None
+        self.last_chunk_at: Optional[float] = None
+        self.chunks = 0
+
+    def sent(self):
+        """Call as the request goes out, so time spent waiting for admission or retries isn't counted"""
+        self.started = time.monotonic()
+
+    def chunk(self):
+        """Call as each content chunk arrives"""
+        now = time.monotonic()
+        if self.first_chunk_at is None:
+            self.first_chunk_at = now
+            metrics.observe('ttft', (now - self.started) * 1000, self.provider, self.model)
+        else:
+            metrics.observe('inter_chunk', (now - self.last_chunk_at) * 1000, self.provider, self.model)
+        self.last_chunk_at = now
+        self.chunks += 1
+
+    def finish(self) -> Dict:
+        """Record the totals and return them for the request report"""
+        total_ms = (time.monotonic() - self.started) * 1000
+        metrics.observe('total', total_ms, self.provider, self.model)
+        timings = {'total_ms': round(total_ms), 'chunks': self.chunks}
+        if self.first_chunk_at is not None:
+            timings['ttft_ms'] = round((self.first_chunk_at - self.started) * 1000)
+            streaming_seconds = self.last_chunk_at - self.first_chunk_at
+            if self.chunks > 1 and streaming_seconds > 0:
+                # Chunks are roughly one token each
+                tokens_per_sec = (self.chunks - 1) / streaming_seconds
+                metrics.observe('tokens_per_sec', tokens_per_sec, self.provider, self.model)
+                timings['tokens_per_sec'] = round(tokens_per_sec, 1)
+        return timings
+
+metrics = Metrics()
@@ -0,0 +1,54 @@
+import sqlite3
+import logging
+from typing import Callable, List, Tuple
+
+SCHEMA_PATH = 'databases/schema.sql'
+
+def _baseline(conn: sqlite3.Connection):
+    """Apply databases/schema.sql, upgrading tables created by older versions first"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+    if columns and 'discord_message_id' not in columns:
+        conn.execute("ALTER TABLE messages ADD COLUMN discord_message_id TEXT")
+    with open(SCHEMA_PATH, 'r') as schema_file:
+        conn.executescript(schema_file.read())
+
+def _channel_history_indexes(conn: sqlite3.Connection):
+    """Composite indexes so per-channel history reads walk the index instead of sorting"""
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_messages_channel_timestamp ON messages(channel_id, timestamp, id);
+        DROP INDEX IF EXISTS idx_messages_channel;
+        CREATE INDEX IF NOT EXISTS idx_summaries_channel_end ON chat_summaries(channel_id, end_timestamp);
+        DROP INDEX IF EXISTS idx_summaries_channel;
+    """)
+
+def _response_cache(conn: sqlite3.Connection):
+    """Persistent tier of the completion response cache"""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache(expires_at);
+    """)
+
+# Ordered list of (version, migration); append new entries, never edit applied ones
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _baseline),
+    (2, _channel_history_indexes),
+    (3, _response_cache),
+]
+
+def migrate(conn: sqlite3.Connection):
+    """Bring the database up to the latest version tracked in PRAGMA user_version"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        logging.info(f"[DB] Applying migration {version}: {migration.__doc__}")
+        migration(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        current = version
@@ -0,0 +1,53 @@
+from typing import NamedTuple
+
+# Completion length caps for text and vision requests to models without their own reply_tokens
+DEFAULT_MAX_TOKENS = 1000
+VISION_MAX_TOKENS = 2000
+
+class ModelCapabilities(NamedTuple):
+    context_window: int  # Prompt plus completion tokens the model accepts
+    max_output: int  # Most completion tokens the provider will return
+    reply_tokens: int = DEFAULT_MAX_TOKENS  # Completion tokens to ask for on a normal reply
+
+DEFAULT_CAPABILITIES = ModelCapabilities(8192, 4096)
+
+MODEL_CAPABILITIES = {
+    "anthropic/claude-2": ModelCapabilities(200000, 4096),
+    "anthropic/claude-instant-1.1": ModelCapabilities(100000, 4096),
+    "anthropic/claude-3-opus:beta": ModelCapabilities(200000, 4096),
+    "anthropic/claude-3.5-sonnet:beta": ModelCapabilities(200000, 8192),
+    "anthracite-org/magnum-v4-72b": ModelCapabilities(32768, 1024),
+    "cohere/command-r-plus": ModelCapabilities(128000, 4000),
+    "google/gemini-flash-1.5": ModelCapabilities(1000000, 8192),
+    "google/gemini-pro-1.5": ModelCapabilities(2000000, 8192),
+    "google/gemma-2-27b-it": ModelCapabilities(8192, 2048),
+    "gryphe/mythomax-l2-13b": ModelCapabilities(4096, 4096),
+    "liquid/lfm-40b:free": ModelCapabilities(32768, 4096),
+    "meta-llama/llama-3.2-11b-vision-instruct:free": ModelCapabilities(131072, 8192),
+    "mistralai/ministral-8b": ModelCapabilities(128000, 4096),
+    "neversleep/noromaid-20b": ModelCapabilities(8192, 2048),
+    "nousresearch/hermes-3-llama-3.1-405b:free": ModelCapabilities(131072, 8192),
+    "nvidia/llama-3.1-nemotron-70b-instruct": ModelCapabilities(131072, 8192),
+    # Reasoning tokens count towards the completion, so o1 needs far more room to answer
+    "openai/o1-mini": ModelCapabilities(128000, 65536, 8000),
+    "openchat/openchat-7b:free": ModelCapabilities(8192, 4096),
+    "perplexity/llama-3.1-sonar-huge-128k-online": ModelCapabilities(127072, 8192),
+    "perplexity/llama-3.1-sonar-large-128k-online": ModelCapabilities(127072, 8192),
+    "x-ai/grok-beta": ModelCapabilities(131072, 8192),
+    "openpipe:moa-gpt-4o-v1": ModelCapabilities(128000, 16384),
+}
+
+def get_capabilities(model: str) -> ModelCapabilities:
+    """Context window and output limits for a model, with conservative defaults for unknown ones"""
+    return MODEL_CAPABILITIES.get(model, DEFAULT_CAPABILITIES)
+
+def max_output_tokens(model: str, vision: bool = False) -> int:
+    """max_tokens to request for a reply (vision replies get room for a longer description)"""
+    capabilities = get_capabilities(model)
+    requested = max(capabilities.reply_tokens, VISION_MAX_TOKENS) if vision else capabilities.reply_tokens
+    return min(requested, capabilities.max_output)
+
+def prompt_budget(model: str, max_prompt_tokens: int, vision: bool = False) -> int:
+    """Tokens available for the prompt: what's left of the context window after the reply, capped at max_prompt_tokens"""
+    capabilities = get_capabilities(model)
+    return max(min(capabilities.context_window - max_output_tokens(model, vision), max_prompt_tokens), 0)
@@ -0,0 +1,85 @@
+import json
+import time
+import string
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Tuple
+
+PROMPTS_FILE = 'prompts/consolidated_prompts.json'
+
+_formatter = string.Formatter()
+
+@lru_cache(maxsize=1)
+def load_system_prompts() -> Dict[str, str]:
+    """Parse consolidated_prompts.json once for every agent"""
+    try:
+        with open(PROMPTS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('system_prompts', {})
+    except Exception as e:
+        logging.warning(f"Failed to load {PROMPTS_FILE}, agents will use the default prompt: {str(e)}")
+        return {}
+
+def get_system_prompt(key: str, default: str) -> str:
+    """Get an agent's raw prompt template by key, or the default"""
+    return load_system_prompts().get(key.lower(), default)
+
+class PromptTemplate:
+    """
+    System prompt template pre-split into literal and field segments.
+    bind() renders the fields that only change per channel (and caches the
+    result), leaving render() to fill in the per-response fields.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self.segments = []
+        for literal, field_name, format_spec, conversion in _formatter.parse(template):
+            if literal:
+                self.segments.append(literal)
+            if field_name is not None:
+                self.segments.append((field_name, format_spec or '', conversion))
+        self._bind_cached = lru_cache(maxsize=512)(self._bind)
+
+    @staticmethod
+    def _format(field, values):
+        field_name, format_spec, conversion = field
+        obj, _ = _formatter.get_field(field_name, (), values)
+        return _formatter.format_field(_formatter.convert_field(obj, conversion), format_spec)
+
+    def _bind(self, static_items: Tuple) -> Tuple:
+        static = dict(static_items)
+        parts = []
+        for segment in self.segments:
+            if not isinstance(segment, str) and segment[0].split('.')[0].split('[')[0] in static:
+                segment = self._format(segment, static)
+            # Merge adjacent literals so render() joins as few pieces as possible
+            if isinstance(segment, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += segment
+            else:
+                parts.append(segment)
+        return tuple(parts)
+
+    def bind(self, **static) -> Tuple:
+        """Pre-render the static fields (cached per distinct set of values)"""
+        return self._bind_cached(tuple(sorted(static.items())))
+
+    def render(self, bound: Tuple, **dynamic) -> str:
+        """Fill the remaining fields of a bound template"""
+        return ''.join(part if isinstance(part, str) else self._format(part, dynamic) for part in bound)
+
+@lru_cache(maxsize=256)
+def compile_prompt(template: str) -> PromptTemplate:
+    """Compile (and cache) a prompt template"""
+    return PromptTemplate(template)
+
+_clock_cache = (None, None, None)
+
+def current_time_fields() -> Tuple[str, str]:
+    """Return the (TIME, TZ) prompt values, recomputed at most once per minute"""
+    global _clock_cache
+    minute = int(time.time() // 60)
+    if _clock_cache[0] != minute:
+        now = datetime.now().astimezone()
+        _clock_cache = (minute, now.strftime("%I:%M %p"), str(now.tzinfo))
+    return _clock_cache[1], _clock_cache[2]
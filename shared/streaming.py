@@ -0,0 +1,89 @@
+import re
+from typing import List
+
+# Sentence ends, paragraph breaks and code fences; inside a fence only the closing fence counts
+_BOUNDARY = re.compile(r'[.!?]+\s+|\n{2,}|```')
+_FENCE = re.compile(r'```')
+
+# Enough to rescan a terminator or fence that was cut in half by a chunk boundary
+_LOOKBACK = 3
+
+class SentenceSegmenter:
+    """
+    Incremental segmenter for streamed replies. Each feed() only scans the
+    newly arrived text and returns the complete units found so far:
+    sentences, paragraphs, or whole markdown code blocks. Units are exact
+    slices of the input, except that a unit longer than max_unit is split,
+    closing and reopening the code fence if the split lands inside one.
+    """
+
+    def __init__(self, max_unit: int = 1800):
+        self.max_unit = max_unit
+        self._buffer = ""
+        self._scan_from = 0
+        self._in_fence = False
+
+    @property
+    def pending(self) -> str:
+        """Text received but not yet emitted as a complete unit"""
+        return self._buffer
+
+    def feed(self, text: str) -> List[str]:
+        """Add a chunk and return the units it completed"""
+        self._buffer += text
+        units = []
+        while True:
+            unit = self._next_unit()
+            if unit is None:
+                break
+            if unit:
+                units.append(unit)
+        return units
+
+    def flush(self) -> str:
+        """Return whatever is left once the stream ends"""
+        rest, self._buffer = self._buffer, ""
+        self._scan_from = 0
+        self._in_fence = False
+        return rest
+
+    def _take(self, end: int, scan_from: int = 0) -> str:
+        unit, self._buffer = self._buffer[:end], self._buffer[end:]
+        self._scan_from = scan_from
+        return unit
+
+    def _next_unit(self):
+        if self._in_fence:
+            match = _FENCE.search(self._buffer, self._scan_from)
+            if match:
+                self._in_fence = False
+                return self._take(match.end())
+        else:
+            match = _BOUNDARY.search(self._buffer, self._scan_from)
+            if match and match.group() == '```':
+                # Emit the prose before the fence; the code block becomes the next unit
+                self._in_fence = True
+                return self._take(match.start(), scan_from=3)
+            if match:
+                return self._take(match.end())
+
+        if len(self._buffer) > self.max_unit:
+            return self._force_split()
+        self._scan_from = max(len(self._buffer) - _LOOKBACK, 3 if self._in_fence else 0, self._scan_from)
+        return None
+
+    def _force_split(self) -> str:
+        limit = self.max_unit
+        if not self._in_fence:
+            cut = max(self._buffer.rfind(' ', 0, limit), self._buffer.rfind('\n', 0, limit))
+            return self._take(cut + 1 if cut > 0 else limit)
+
+        # Split on a line break inside the block, then reopen it with the same info string
+        header_end = self._buffer.find('\n', 0, limit)
+        header = self._buffer[:header_end + 1] if header_end >= 0 else "```\n"
+        cut = self._buffer.rfind('\n', len(header), limit)
+        cut = cut + 1 if cut >= 0 else limit
+        unit = self._buffer[:cut]
+        self._buffer = header + self._buffer[cut:]
+        self._scan_from = len(header)
+        return unit + ("```" if unit.endswith('\n') else "\n```")
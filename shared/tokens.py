@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional, Union
+
+# Rough cost of the role/formatting wrapper around each chat message, and of one attached image
+MESSAGE_OVERHEAD_TOKENS = 4
+IMAGE_TOKENS = 800
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local token estimate without a tokenizer: about four ASCII
+    characters per token, and one token per non-ASCII character (CJK, emoji)
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+def estimate_content_tokens(content: Union[str, List[Dict], None]) -> int:
+    """Estimate a message's content, which may be a list of text and image parts"""
+    if isinstance(content, list):
+        return sum(
+            IMAGE_TOKENS if part.get('type') == 'image_url' else estimate_tokens(part.get('text', ''))
+            for part in content
+        )
+    return estimate_tokens(content or "")
+
+def estimate_message_tokens(message: Dict) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + estimate_content_tokens(message.get('content'))
+
+def estimate_messages_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_message_tokens(message) for message in messages)
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " […]") -> str:
+    """Cut text so its estimate fits max_tokens, keeping the start and marking the cut"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(marker)
+    if budget <= 0:
+        return ""
+    # Start from the most characters that could fit, then shrink until the estimate does
+    end = min(len(text), budget * 4)
+    while end > 0 and estimate_tokens(text[:end]) > budget:
+        end -= max(1, (estimate_tokens(text[:end]) - budget))
+    return text[:end].rstrip() + marker
+
+class HistoryBudget:
+    """
+    Admits chat history newest-first until the prompt budget is spent.
+    Messages over max_message_tokens are truncated rather than dropped; the
+    first message that doesn't fit ends the history, so it never has gaps.
+    """
+
+    def __init__(self, budget: int, max_message_tokens: int):
+        self.remaining = budget
+        self.max_message_tokens = max_message_tokens
+        self.full = budget <= 0
+
+    def take(self, message: Dict) -> Optional[Dict]:
+        """The message (truncated if oversized) if it fits, otherwise None"""
+        if self.full:
+            return None
+        tokens = estimate_message_tokens(message)
+        if tokens > self.max_message_tokens and isinstance(message.get('content'), str):
+            content = truncate_to_tokens(message['content'], self.max_message_tokens - MESSAGE_OVERHEAD_TOKENS)
+            message = {**message, 'content': content}
+            tokens = estimate_message_tokens(message)
+        if tokens > self.remaining:
+            self.full = True
+            return None
+        self.remaining -= tokens
+        return message
+
+    def fit(self, messages: List[Dict]) -> List[Dict]:
+        """Fit an already-fetched chronological history, keeping its newest messages"""
+        kept = []
+        for message in reversed(messages):
+            message = self.take(message)
+            if message is None:
+                break
+            kept.append(message)
+        kept.reverse()
+        return kept
@@ -0,0 +1,74 @@
+import re
+import logging
+from typing import Dict, List, Set
+
+class TriggerIndex:
+    """
+    Compiles the trigger words of every registered agent into one regex so a
+    single pass over a message returns every agent it triggers.
+    """
+
+    def __init__(self):
+        self._agents = []
+        self._pattern = None
+        self._agents_by_trigger: Dict[str, Set] = {}
+        self._dirty = True
+
+    def register(self, agent):
+        """Add an agent (anything with a trigger_words list) to the index"""
+        if agent not in self._agents:
+            self._agents.append(agent)
+            self._dirty = True
+
+    def unregister(self, agent):
+        """Remove an agent from the index"""
+        if agent in self._agents:
+            self._agents.remove(agent)
+            self._dirty = True
+
+    def _compile(self):
+        """Rebuild the combined pattern from the registered agents"""
+        agents_by_trigger: Dict[str, Set] = {}
+        for agent in self._agents:
+            for word in getattr(agent, 'trigger_words', []):
+                word = word.strip().lower()
+                if word:
+                    agents_by_trigger.setdefault(word, set()).add(agent)
+
+        # The regex reports one trigger per position (the longest), so fold the
+        # agents of shorter triggers that are whole-word prefixes of it into it
+        # ('claude 3' must also fire everything listening for 'claude').
+        closure = {}
+        for trigger, agents in agents_by_trigger.items():
+            matched = set(agents)
+            for other, other_agents in agents_by_trigger.items():
+                if (len(other) < len(trigger) and trigger.startswith(other)
+                        and not re.match(r'\w', trigger[len(other)])):
+                    matched |= other_agents
+            closure[trigger] = matched
+
+        if closure:
+            alternation = '|'.join(re.escape(t) for t in sorted(closure, key=len, reverse=True))
+            # Zero-width lookahead so overlapping triggers at later positions are still found
+            self._pattern = re.compile(rf'(?<!\w)(?=({alternation})(?!\w))', re.IGNORECASE)
+        else:
+            self._pattern = None
+        self._agents_by_trigger = closure
+        self._dirty = False
+        logging.debug(f"[Triggers] Compiled {len(closure)} trigger words for {len(self._agents)} agents")
+
+    def match(self, content: str) -> List:
+        """Return the agents triggered by the content, in registration order"""
+        if self._dirty:
+            self._compile()
+        if not content or self._pattern is None:
+            return []
+
+        matched = set()
+        for m in self._pattern.finditer(content):
+            matched |= self._agents_by_trigger[m.group(1).lower()]
+        if not matched:
+            return []
+        return [agent for agent in self._agents if agent in matched]
+
+trigger_index = TriggerIndex()
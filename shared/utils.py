@@ -1,9 +1,9 @@
 import json
 import logging
-import sqlite3
-import aiosqlite
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Union, Tuple
+from shared.db import db
+from shared.tokens import HistoryBudget
 
 def analyze_emotion(text):
     """
@@ -41,79 +41,116 @@ def analyze_emotion(text):
     # Return corresponding emoji, default to neutral
     return emotions[max_emotion[0]][1] if max_emotion[1] > 0 else emotions['neutral'][1]
 
-async def get_message_history(channel_id: str, limit: int = 50) -> List[Dict]:
+async def fetch_message_rows(channel_id: str, limit: int = 50, before: Optional[Tuple[str, int]] = None,
+                             exclude_message_id: Optional[str] = None) -> List[Tuple]:
+    """
+    Fetch one page of a channel's messages, newest first, using keyset pagination
+    Rows are (id, timestamp, content, is_assistant, persona_name); pass the
+    (timestamp, id) of the last row as before to get the next page
+    """
+    sql = """
+        SELECT id, timestamp, content, is_assistant, persona_name
+        FROM messages 
+        WHERE channel_id = ?
+        AND (? IS NULL OR discord_message_id IS NOT ?)
+    """
+    params = [str(channel_id), exclude_message_id, exclude_message_id]
+    if before is not None:
+        sql += " AND (timestamp, id) < (?, ?)"
+        params.extend(before)
+    sql += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return await db.fetchall(sql, params)
+
+def format_history_rows(rows: List[Tuple]) -> List[Dict]:
+    """Convert newest-first message rows to API format (role, content) in chronological order"""
+    messages = []
+    
+    for _, timestamp, content, is_assistant, persona_name in rows:
+        # For assistant messages
+        if is_assistant:
+            # Remove model name prefix if present
+            if content.startswith('[') and ']' in content:
+                content = content[content.index(']')+1:].strip()
+            
+            # Add name field for vision messages
+            if persona_name == "Llama-Vision":
+                messages.append({
+                    "role": "assistant",
+                    "name": persona_name,
+                    "content": content
+                })
+            else:
+                messages.append({
+                    "role": "assistant",
+                    "content": content
+                })
+        else:
+            messages.append({
+                "role": "user",
+                "content": content
+            })
+    
+    # Reverse to get chronological order
+    messages.reverse()
+    return messages
+
+async def get_message_history(channel_id: str, limit: int = 50, exclude_message_id: Optional[str] = None,
+                              before: Optional[Tuple[str, int]] = None) -> List[Dict]:
     """
     Fetch the last N messages from the database for a given channel
     Returns list of messages in API format (role, content)
+
+    exclude_message_id skips the message currently being answered, which the
+    caller appends itself and which may or may not have been flushed yet by
+    the write-behind queue.
     """
     try:
-        db_path = 'databases/interaction_logs.db'
-        async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.cursor()
-            
-            # Get last N messages ordered by timestamp
-            await cursor.execute("""
-                SELECT content, is_assistant, persona_name, timestamp
-                FROM messages 
-                WHERE channel_id = ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            """, (str(channel_id), limit))
-            
-            rows = await cursor.fetchall()
-            messages = []
-            seen_content = set()
-            
-            for content, is_assistant, persona_name, timestamp in rows:
-                # Skip if we've seen this exact content before
-                if content in seen_content:
-                    continue
-                seen_content.add(content)
-                
-                # For assistant messages
-                if is_assistant:
-                    # Remove model name prefix if present
-                    if content.startswith('[') and ']' in content:
-                        content = content[content.index(']')+1:].strip()
-                    
-                    # Add name field for vision messages
-                    if persona_name == "Llama-Vision":
-                        messages.append({
-                            "role": "assistant",
-                            "name": persona_name,
-                            "content": content
-                        })
-                    else:
-                        messages.append({
-                            "role": "assistant",
-                            "content": content
-                        })
-                else:
-                    messages.append({
-                        "role": "user",
-                        "content": content
-                    })
-            
-            # Reverse to get chronological order
-            messages.reverse()
-            return messages
+        rows = await fetch_message_rows(channel_id, limit, before=before, exclude_message_id=exclude_message_id)
+        return format_history_rows(rows)
 
     except Exception as e:
         logging.error(f"Failed to fetch message history: {str(e)}")
         return []
 
+async def get_history_within_budget(channel_id: str, budget: HistoryBudget, max_messages: int = 50,
+                                    page_size: int = 20, exclude_message_id: Optional[str] = None) -> List[Dict]:
+    """
+    Fetch a channel's history newest-first, a keyset page at a time, until the
+    token budget or max_messages is reached
+    Returns list of messages in API format (role, content) in chronological order
+    """
+    kept = []
+    before = None
+    try:
+        while len(kept) < max_messages:
+            rows = await fetch_message_rows(channel_id, min(page_size, max_messages - len(kept)),
+                                            before=before, exclude_message_id=exclude_message_id)
+            for row in rows:
+                message = budget.take(format_history_rows([row])[0])
+                if message is None:
+                    break
+                kept.append(message)
+            if budget.full or len(rows) < page_size:
+                break
+            before = (rows[-1][1], rows[-1][0])
+    except Exception as e:
+        logging.error(f"Failed to fetch message history: {str(e)}")
+    kept.reverse()
+    return kept
+
 async def store_alt_text(message_id: str, channel_id: str, alt_text: str, attachment_url: str) -> bool:
-    """Store image alt text in the database"""
+    """Store image alt text in the database (the first description stored for a message is kept)"""
     try:
-        db_path = 'databases/interaction_logs.db'
-        async with aiosqlite.connect(db_path) as conn:
-            await conn.execute("""
-                INSERT INTO image_alt_text (message_id, channel_id, alt_text, attachment_url)
-                VALUES (?, ?, ?, ?)
-            """, (str(message_id), str(channel_id), alt_text, attachment_url))
-            await conn.commit()
-            logging.debug(f"Stored alt text for message {message_id}")
-            return True
+        # Wait for the batch to commit so the alt text is readable by the response that follows
+        future = await db.write("""
+            INSERT INTO image_alt_text (message_id, channel_id, alt_text, attachment_url)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(message_id) DO NOTHING
+        """, (str(message_id), str(channel_id), alt_text, attachment_url))
+        await future
+        logging.debug(f"Stored alt text for message {message_id}")
+        return True
     except Exception as e:
         logging.error(f"Failed to store alt text: {str(e)}")
         return False
@@ -121,15 +158,11 @@ async def store_alt_text(message_id: str, channel_id: str, alt_text: str, attach
 async def get_alt_text(message_id: str) -> Optional[str]:
     """Retrieve alt text for a message"""
     try:
-        db_path = 'databases/interaction_logs.db'
-        async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.cursor()
-            await cursor.execute("""
-                SELECT alt_text FROM image_alt_text
-                WHERE message_id = ?
-            """, (str(message_id),))
-            result = await cursor.fetchone()
-            return result[0] if result else None
+        result = await db.fetchone("""
+            SELECT alt_text FROM image_alt_text
+            WHERE message_id = ?
+        """, (str(message_id),))
+        return result[0] if result else None
     except Exception as e:
         logging.error(f"Failed to get alt text: {str(e)}")
         return None
@@ -137,98 +170,121 @@ async def get_alt_text(message_id: str) -> Optional[str]:
 async def get_unprocessed_images(channel_id: str, limit: int = 50) -> List[Dict]:
     """Get messages with images that don't have alt text"""
     try:
-        db_path = 'databases/interaction_logs.db'
-        async with aiosqlite.connect(db_path) as conn:
-            cursor = await conn.cursor()
-            await cursor.execute("""
-                SELECT m.id, m.channel_id, m.content
-                FROM messages m
-                LEFT JOIN image_alt_text i ON m.id = i.message_id
-                WHERE m.channel_id = ?
-                AND m.content LIKE '%https://%'
-                AND i.message_id IS NULL
-                ORDER BY m.timestamp DESC
-                LIMIT ?
-            """, (str(channel_id), limit))
-            rows = await cursor.fetchall()
-            return [{"message_id": row[0], "channel_id": row[1], "content": row[2]} 
-                   for row in rows]
+        rows = await db.fetchall("""
+            SELECT m.discord_message_id, m.channel_id, m.content
+            FROM messages m
+            LEFT JOIN image_alt_text i ON m.discord_message_id = i.message_id
+            WHERE m.channel_id = ?
+            AND m.discord_message_id IS NOT NULL
+            AND m.content LIKE '%https://%'
+            AND i.message_id IS NULL
+            ORDER BY m.timestamp DESC
+            LIMIT ?
+        """, (str(channel_id), limit))
+        return [{"message_id": row[0], "channel_id": row[1], "content": row[2]} 
+               for row in rows]
     except Exception as e:
         logging.error(f"Failed to get unprocessed images: {str(e)}")
         return []
 
 async def log_interaction(user_id: Union[int, str], guild_id: Optional[Union[int, str]], 
                         persona_name: str, user_message: Union[str, Dict, Any], assistant_reply: str, 
-                        emotion: Optional[str] = None, channel_id: Optional[Union[int, str]] = None):
+                        emotion: Optional[str] = None, channel_id: Optional[Union[int, str]] = None,
+                        message_id: Optional[Union[int, str]] = None, reply_message_id: Optional[Union[int, str]] = None):
     """
     Log interaction details to SQLite database
+
+    The user's message is ingested once by ContextCog, keyed by its Discord
+    message ID; when message_id is given only the assistant reply is written
+    here and linked to that row. Replies are upserted on reply_message_id.
     """
     try:
-        db_path = 'databases/interaction_logs.db'
-        async with aiosqlite.connect(db_path) as conn:
-            # Convert all values to strings to prevent type issues
-            channel_id = str(channel_id) if channel_id else None
-            guild_id = str(guild_id) if guild_id else None
-            user_id = str(user_id)
-            persona_name = str(persona_name)
-            
-            # Handle user_message that might be a Discord Message object or other complex type
-            if isinstance(user_message, str):
-                user_message_content = user_message
-            elif isinstance(user_message, dict):
-                user_message_content = json.dumps(user_message)
-            else:
-                # Try to convert to string, fallback to repr if needed
-                try:
-                    user_message_content = str(user_message)
-                except:
-                    user_message_content = repr(user_message)
-            
-            assistant_reply = str(assistant_reply)
-            emotion = str(emotion) if emotion else None
-            timestamp = datetime.now().isoformat()
-            
+        # Convert all values to strings to prevent type issues
+        channel_id = str(channel_id) if channel_id else None
+        guild_id = str(guild_id) if guild_id else None
+        user_id = str(user_id)
+        persona_name = str(persona_name)
+        
+        # Handle user_message that might be a Discord Message object or other complex type
+        if isinstance(user_message, str):
+            user_message_content = user_message
+        elif isinstance(user_message, dict):
+            user_message_content = json.dumps(user_message)
+        else:
+            # Try to convert to string, fallback to repr if needed
+            try:
+                user_message_content = str(user_message)
+            except:
+                user_message_content = repr(user_message)
+        
+        assistant_reply = str(assistant_reply)
+        emotion = str(emotion) if emotion else None
+        timestamp = datetime.now().isoformat()
+        
+        statements = []
+        if message_id is not None:
+            # User message was already ingested under its Discord message ID
+            parent_sql = "(SELECT id FROM messages WHERE discord_message_id = ?)"
+            parent_params = (str(message_id),)
+        else:
             # Log user message
-            cursor = await conn.cursor()
-            await cursor.execute("""
+            statements.append(("""
                 INSERT INTO messages (
                     channel_id, guild_id, user_id, content, 
                     is_assistant, emotion, timestamp
                 ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (channel_id, guild_id, user_id, user_message_content, False, None, timestamp))
-            
-            user_message_id = cursor.lastrowid
-            
-            # Log assistant reply
-            await cursor.execute("""
-                INSERT INTO messages (
-                    channel_id, guild_id, user_id, persona_name,
-                    content, is_assistant, emotion, parent_message_id,
-                    timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (channel_id, guild_id, user_id, persona_name,
-                 assistant_reply, True, emotion, user_message_id, timestamp))
-            
-            await conn.commit()
-            logging.debug(f"Successfully logged interaction for user {user_id}")
+            """, (channel_id, guild_id, user_id, user_message_content, False, None, timestamp)))
+            parent_sql = "last_insert_rowid()"
+            parent_params = ()
+        
+        # Log assistant reply
+        statements.append((f"""
+            INSERT INTO messages (
+                channel_id, guild_id, user_id, persona_name,
+                content, is_assistant, emotion, parent_message_id,
+                timestamp, discord_message_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, {parent_sql}, ?, ?)
+            ON CONFLICT(discord_message_id) DO UPDATE SET
+                content = excluded.content,
+                emotion = excluded.emotion
+        """, (channel_id, guild_id, user_id, persona_name,
+             assistant_reply, True, emotion) + parent_params + (timestamp,
+             str(reply_message_id) if reply_message_id is not None else None)))
+        
+        # Queue on the write-behind writer; fall back to JSONL if the batch fails
+        log_entry = {
+            'timestamp': timestamp,
+            'user_id': user_id,
+            'guild_id': guild_id,
+            'channel_id': channel_id,
+            'persona': persona_name,
+            'user_message': user_message_content,
+            'assistant_reply': assistant_reply,
+            'emotion': emotion
+        }
+        future = await db.write_many(statements)
+        future.add_done_callback(
+            lambda f: _log_interaction_jsonl(log_entry, f.exception()) if not f.cancelled() and f.exception() else None
+        )
+        logging.debug(f"Queued interaction log for user {user_id}")
             
     except Exception as e:
-        logging.error(f"Failed to log interaction: {str(e)}")
-        # Fallback to JSONL logging if database fails
-        try:
-            log_entry = {
-                'timestamp': datetime.now().isoformat(),
-                'user_id': str(user_id),
-                'guild_id': str(guild_id) if guild_id else None,
-                'channel_id': str(channel_id) if channel_id else None,
-                'persona': str(persona_name),
-                'user_message': str(user_message_content) if 'user_message_content' in locals() else str(user_message),
-                'assistant_reply': str(assistant_reply),
-                'emotion': str(emotion) if emotion else None
-            }
-            
-            with open('interaction_logs.jsonl', 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry) + '\n')
-                
-        except Exception as e2:
-            logging.error(f"Failed to log interaction to JSONL: {str(e2)}")
+        _log_interaction_jsonl({
+            'timestamp': datetime.now().isoformat(),
+            'user_id': str(user_id),
+            'guild_id': str(guild_id) if guild_id else None,
+            'channel_id': str(channel_id) if channel_id else None,
+            'persona': str(persona_name),
+            'user_message': str(user_message_content) if 'user_message_content' in locals() else str(user_message),
+            'assistant_reply': str(assistant_reply),
+            'emotion': str(emotion) if emotion else None
+        }, e)
+
+def _log_interaction_jsonl(log_entry: Dict[str, Any], error: Exception):
+    """Fallback to JSONL logging if database fails"""
+    logging.error(f"Failed to log interaction: {str(error)}")
+    try:
+        with open('interaction_logs.jsonl', 'a', encoding='utf-8') as f:
+            f.write(json.dumps(log_entry) + '\n')
+    except Exception as e2:
+        logging.error(f"Failed to log interaction to JSONL: {str(e2)}")
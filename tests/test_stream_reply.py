@@ -0,0 +1,110 @@
+import os
+import asyncio
+
+os.environ.setdefault('OPENPIPE_API_KEY', 'test')
+os.environ.setdefault('OPENROUTER_API_KEY', 'test')
+
+from cogs.base_cog import BaseCog, RerollView
+from shared.errors import StreamStalled
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 1
+        self.sent = []
+
+    async def send(self, content):
+        message = FakeMessage(self, content)
+        self.sent.append(message)
+        return message
+
+class FakeMessage:
+    _next_id = 100
+
+    def __init__(self, channel, content=""):
+        FakeMessage._next_id += 1
+        self.id = FakeMessage._next_id
+        self.channel = channel
+        self.content = content
+        self.edits = []
+        self.reactions = []
+
+    async def edit(self, **kwargs):
+        self.edits.append(kwargs)
+        if kwargs.get('content') is not None:
+            self.content = kwargs['content']
+
+    async def add_reaction(self, emoji):
+        self.reactions.append(emoji)
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content, ephemeral=False):
+        self.sent.append(content)
+
+class FakeResponse:
+    async def defer(self):
+        pass
+
+class FakeInteraction:
+    def __init__(self, message):
+        self.message = message
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+async def stalling_stream():
+    yield "Partial answer. "
+    yield "More text. "
+    raise StreamStalled("model stalled between chunks", "openrouter", "test/model")
+
+def make_cog():
+    cog = BaseCog.__new__(BaseCog)
+    cog.name = "Test"
+    cog.model = "test/model"
+
+    async def generate_response(message, messages=None):
+        return stalling_stream()
+    cog.generate_response = generate_response
+    return cog
+
+def test_failed_stream_finalizes_message():
+    async def run():
+        cog = make_cog()
+        channel = FakeChannel()
+        request = FakeMessage(channel, "hi test")
+        reply = FakeMessage(channel, "[Test] ")
+        try:
+            await cog.stream_reply(stalling_stream(), request, reply)
+        except StreamStalled:
+            pass
+        else:
+            raise AssertionError("the stream error should propagate")
+        return reply
+
+    reply = asyncio.run(run())
+    final = reply.edits[-1]
+    assert final['content'].startswith("[Test] Partial answer. More text.")
+    assert "temporarily unavailable" in final['content']
+    assert isinstance(final['view'], RerollView)
+
+def test_failed_reroll_leaves_message_finalized():
+    async def run():
+        cog = make_cog()
+        channel = FakeChannel()
+        request = FakeMessage(channel, "hi test")
+        original = FakeMessage(channel, "[Test] The original answer.")
+        view = RerollView(cog, request, "The original answer.")
+        interaction = FakeInteraction(original)
+        await view.reroll.callback(interaction)
+        # Nothing may be left running against the message once the reroll has failed
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return original, interaction, pending
+
+    original, interaction, pending = asyncio.run(run())
+    assert not pending
+    final = original.edits[-1]
+    assert final['content'].startswith("[Test] Partial answer. More text.")
+    assert "temporarily unavailable" in final['content']
+    assert isinstance(final['view'], RerollView)
+    assert interaction.followup.sent